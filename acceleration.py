@@ -0,0 +1,224 @@
+"""
+ASR 模型推理加速: torch.compile 编译音频编码器与解码步骤
+
+build_prompt 把每个音频块都填充到固定的 3000 帧 mel, 编码器输入只有 batch 维
+(音频块数) 会变化。编码器按 batch 维分桶 (1, 2, 4, 8 ...), 输入先补零到桶大小再
+送入静态形状的编译图, 每个桶只编译一次。解码器 (语言模型) 的序列长度每步都在变,
+使用动态形状编译, 避免逐长度重新编译。
+
+编译产物通过 torch.compiler 的缓存工件持久化到 COMPILE_CACHE_DIR, 重启后直接加载,
+启动时间不会因为编译而变长。编译或运行编译图出错时自动回退到 eager 模式。
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import torch
+
+# 音频编码器常见的属性名, 可通过 ASR_ENCODER_ATTR 指定
+ENCODER_ATTR_CANDIDATES = (
+    "audio_encoder",
+    "whisper",
+    "audio_tower",
+    "audio_model",
+    "encoder",
+)
+ASR_ENCODER_ATTR = os.getenv("ASR_ENCODER_ATTR")
+
+COMPILE_CACHE_DIR = Path(os.getenv("COMPILE_CACHE_DIR", "./compile_cache"))
+COMPILE_CACHE_FILE = "compile_artifacts.bin"
+
+
+# ==================== 模块查找 ====================
+
+
+def find_audio_encoder(
+    model, attr: Optional[str] = ASR_ENCODER_ATTR
+) -> Tuple[torch.nn.Module, str]:
+    """
+    查找音频编码器
+    返回: (父模块, 属性名), 编码器为 getattr(父模块, 属性名)
+    """
+    names = (attr,) if attr else ENCODER_ATTR_CANDIDATES
+    for name in names:
+        for _, module in model.named_modules():
+            child = module._modules.get(name)
+            if child is not None:
+                return module, name
+    raise ValueError(
+        f"未找到音频编码器 (尝试的属性名: {', '.join(names)}), 请通过 ASR_ENCODER_ATTR 指定"
+    )
+
+
+def find_language_model(model) -> torch.nn.Module:
+    """查找解码器主体: 第一个同时包含 embed_tokens 和 layers 的子模块"""
+    for _, module in model.named_modules():
+        if hasattr(module, "embed_tokens") and isinstance(
+            getattr(module, "layers", None), torch.nn.ModuleList
+        ):
+            return module
+    raise ValueError("未找到语言模型解码器")
+
+
+# ==================== 编译 ====================
+
+
+class CompiledCall:
+    """
+    调用编译后的函数, 出错时打印原因并永久回退到 eager 函数
+    """
+
+    def __init__(self, eager_fn, name: str, **compile_kwargs):
+        self.eager_fn = eager_fn
+        self.name = name
+        self.compiled_fn = torch.compile(eager_fn, **compile_kwargs)
+
+    @property
+    def enabled(self) -> bool:
+        return self.compiled_fn is not None
+
+    def __call__(self, *args, **kwargs):
+        if self.compiled_fn is not None:
+            try:
+                return self.compiled_fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Compiled {self.name} failed, falling back to eager: {str(e)}")
+                self.compiled_fn = None
+        return self.eager_fn(*args, **kwargs)
+
+
+def bucket_for(size: int, buckets: List[int]) -> Optional[int]:
+    """不小于 size 的最小桶, 超出最大桶时返回 None"""
+    for bucket in buckets:
+        if bucket >= size:
+            return bucket
+    return None
+
+
+def pad_batch(value, batch: int, bucket: int):
+    """将第 0 维为 batch 的张量补零到 bucket"""
+    if isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == batch:
+        padding = value.new_zeros((bucket - batch, *value.shape[1:]))
+        return torch.cat([value, padding], dim=0)
+    return value
+
+
+def slice_batch(value, bucket: int, batch: int):
+    """截掉补齐的部分, 支持张量、元组和 ModelOutput"""
+    if isinstance(value, torch.Tensor):
+        if value.dim() > 0 and value.shape[0] == bucket:
+            return value[:batch]
+        return value
+    if isinstance(value, dict):
+        # ModelOutput 是 dict 子类, 保留原类型
+        for key in list(value.keys()):
+            value[key] = slice_batch(value[key], bucket, batch)
+        return value
+    if isinstance(value, (tuple, list)):
+        return type(value)(slice_batch(v, bucket, batch) for v in value)
+    return value
+
+
+class EncoderWrapper(torch.nn.Module):
+    """
+    替换模型中音频编码器的包装模块, 原编码器保存在 self.encoder
+    模型代码可能访问编码器的其他属性 (如 config / dtype), 找不到的属性转发给原编码器
+    """
+
+    def __init__(self, encoder: torch.nn.Module):
+        super().__init__()
+        self.encoder = encoder
+
+    def __getattr__(self, name):
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(self.encoder, name)
+
+
+class BucketedEncoder(EncoderWrapper):
+    """
+    分桶编译的音频编码器: 把 batch 维补齐到桶大小后调用静态形状的编译图
+    超过最大桶的输入直接走 eager
+    """
+
+    def __init__(self, encoder: torch.nn.Module, buckets: List[int]):
+        super().__init__(encoder)
+        self.buckets = sorted(buckets)
+        self.compiled = CompiledCall(encoder, "audio encoder", dynamic=False)
+
+    def forward(self, features, *args, **kwargs):
+        batch = features.shape[0]
+        bucket = bucket_for(batch, self.buckets)
+        if not self.compiled.enabled or bucket is None:
+            return self.encoder(features, *args, **kwargs)
+
+        features = pad_batch(features, batch, bucket)
+        args = [pad_batch(a, batch, bucket) for a in args]
+        kwargs = {k: pad_batch(v, batch, bucket) for k, v in kwargs.items()}
+        return slice_batch(self.compiled(features, *args, **kwargs), bucket, batch)
+
+
+def enable_compile(model, targets: List[str], buckets: List[int]):
+    """
+    为模型启用 torch.compile
+    targets: "encoder" 和/或 "decoder"
+    """
+    load_compile_cache()
+
+    if "encoder" in targets:
+        try:
+            parent, name = find_audio_encoder(model)
+            setattr(parent, name, BucketedEncoder(getattr(parent, name), buckets))
+            print(f"Compiling audio encoder ({name}) with batch buckets {buckets}")
+        except ValueError as e:
+            print(f"Skip compiling audio encoder: {str(e)}")
+
+    if "decoder" in targets:
+        try:
+            decoder = find_language_model(model)
+            # 实例属性覆盖 forward, nn.Module.__call__ 会调用它
+            decoder.forward = CompiledCall(decoder.forward, "decoder", dynamic=True)
+            print(f"Compiling decoder ({type(decoder).__name__}) with dynamic shapes")
+        except ValueError as e:
+            print(f"Skip compiling decoder: {str(e)}")
+    return model
+
+
+# ==================== 编译缓存 ====================
+
+
+def configure_compile_cache(cache_dir: Path = COMPILE_CACHE_DIR):
+    """让 inductor 的本地缓存也落在 cache_dir 下, 需在首次编译前调用"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir / "inductor"))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+
+def load_compile_cache(cache_dir: Path = COMPILE_CACHE_DIR):
+    """加载上次保存的编译缓存工件"""
+    configure_compile_cache(cache_dir)
+    path = cache_dir / COMPILE_CACHE_FILE
+    if not path.exists():
+        return
+    try:
+        torch.compiler.load_cache_artifacts(path.read_bytes())
+        print(f"Loaded compile cache from {path}")
+    except Exception as e:
+        print(f"Failed to load compile cache, recompiling: {str(e)}")
+
+
+def save_compile_cache(cache_dir: Path = COMPILE_CACHE_DIR):
+    """保存本进程已生成的编译缓存工件, 一般在预热后调用"""
+    artifacts = torch.compiler.save_cache_artifacts()
+    if artifacts is None:
+        return
+    data, _ = artifacts
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / COMPILE_CACHE_FILE
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    print(f"Saved compile cache to {path} ({len(data) / 2**20:.1f} MB)")
@@ -0,0 +1,197 @@
+"""
+上传的准入控制
+
+按排队深度 (待处理与处理中的任务数) 和排队音频总时长限制新任务, 超出容量时
+上传接口返回 429 并带 Retry-After; 限制分全局和按客户端两级,
+批量导入的客户端达到自己的上限后不会挤占其他客户端的排队容量。
+客户端身份由服务端确定 (API 密钥映射或客户端 IP, 见 resolve_client_id),
+调用方不能通过更换请求头绕过自己的上限。
+
+处理速度取自最近完成的任务 (音频秒数 / 处理耗时), 用于估计新任务的完成时间
+和 Retry-After。并发上传时的检查不加锁, 排队量可能略微超出上限。
+"""
+
+import os
+from typing import Dict, NamedTuple, Optional
+
+
+class Limits(NamedTuple):
+    # 0 表示不限制
+    tasks: int
+    audio_seconds: float
+
+
+def parse_client_limits(value: str) -> Dict[str, Limits]:
+    """
+    解析按客户端的限制: "client_a=100:36000,client_b=10:600"
+    每项为 客户端=任务数:音频秒数
+    """
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        client_id, _, spec = item.strip().partition("=")
+        tasks, _, audio_seconds = spec.partition(":")
+        limits[client_id.strip()] = Limits(int(tasks or 0), float(audio_seconds or 0))
+    return limits
+
+
+def parse_api_keys(value: str) -> Dict[str, str]:
+    """解析 API 密钥到客户端的映射: "key_a=importer,key_b=alice" """
+    keys = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        key, _, client_id = item.strip().partition("=")
+        keys[key.strip()] = client_id.strip()
+    return keys
+
+
+# 全局的排队上限
+ADMISSION_MAX_QUEUED_TASKS = int(os.getenv("ADMISSION_MAX_QUEUED_TASKS", "0"))
+ADMISSION_MAX_QUEUED_AUDIO_SECONDS = float(
+    os.getenv("ADMISSION_MAX_QUEUED_AUDIO_SECONDS", "0")
+)
+# 每个客户端的默认排队上限
+ADMISSION_CLIENT_LIMITS_DEFAULT = Limits(
+    int(os.getenv("ADMISSION_CLIENT_MAX_QUEUED_TASKS", "0")),
+    float(os.getenv("ADMISSION_CLIENT_MAX_QUEUED_AUDIO_SECONDS", "0")),
+)
+# 单独配置的客户端上限, 格式见 parse_client_limits
+ADMISSION_CLIENT_LIMITS = parse_client_limits(os.getenv("ADMISSION_CLIENT_LIMITS", ""))
+# API 密钥 (X-Api-Key 请求头) 到客户端的映射, 格式见 parse_api_keys
+ADMISSION_API_KEYS = parse_api_keys(os.getenv("ADMISSION_API_KEYS", ""))
+# 没有 API 密钥时的客户端身份: ip 或 header (信任 X-Client-Id 请求头,
+# 仅在服务前面有认证代理、由代理设置该请求头时使用)
+CLIENT_ID_SOURCE = os.getenv("CLIENT_ID_SOURCE", "ip")
+# 估计处理速度时参考的最近完成任务数
+ADMISSION_THROUGHPUT_SAMPLE = int(os.getenv("ADMISSION_THROUGHPUT_SAMPLE", "50"))
+# 没有处理速度数据时的 Retry-After（秒）, 以及 Retry-After 的上限
+ADMISSION_DEFAULT_RETRY_AFTER = int(os.getenv("ADMISSION_DEFAULT_RETRY_AFTER", "30"))
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", "600"))
+
+
+class Rejection(NamedTuple):
+    # service 或 client
+    scope: str
+    reason: str
+    retry_after: int
+
+
+SCOPE_NAMES = {"service": "服务", "client": "该客户端"}
+
+
+class InvalidApiKey(Exception):
+    pass
+
+
+def resolve_client_id(
+    api_key: Optional[str], header_client_id: Optional[str], host: Optional[str]
+) -> Optional[str]:
+    """
+    上传请求的客户端身份, 用于按客户端的准入限制和公平调度
+    优先使用 API 密钥映射的客户端, 密钥无效时抛出 InvalidApiKey;
+    CLIENT_ID_SOURCE=header 时使用 X-Client-Id, 否则使用客户端 IP
+    """
+    if api_key is not None:
+        if api_key not in ADMISSION_API_KEYS:
+            raise InvalidApiKey("无效的 API 密钥")
+        return ADMISSION_API_KEYS[api_key]
+    if CLIENT_ID_SOURCE == "header" and header_client_id:
+        return header_client_id
+    return host
+
+
+def client_limits(client_id: Optional[str]) -> Limits:
+    return ADMISSION_CLIENT_LIMITS.get(client_id, ADMISSION_CLIENT_LIMITS_DEFAULT)
+
+
+def throughput(stats: Dict) -> Optional[float]:
+    """
+    当前的处理速度: 每秒墙钟时间处理的音频秒数
+    单个 worker 的速度取自最近完成的任务, 乘以正在处理的任务数; 没有历史数据时返回 None
+    """
+    if stats["recent_busy_seconds"] <= 0 or stats["recent_audio_seconds"] <= 0:
+        return None
+    per_worker = stats["recent_audio_seconds"] / stats["recent_busy_seconds"]
+    return per_worker * max(stats["processing"], 1)
+
+
+def retry_after(stats: Dict, excess_audio_seconds: float) -> int:
+    """按处理速度估计排队量降到上限以下需要的时间"""
+    rate = throughput(stats)
+    if rate is None:
+        return ADMISSION_DEFAULT_RETRY_AFTER
+    return int(min(max(excess_audio_seconds / rate, 1), ADMISSION_MAX_RETRY_AFTER))
+
+
+def over_limit(
+    limits: Limits,
+    tasks: int,
+    queued_seconds: float,
+    audio_seconds: float,
+    stats: Dict,
+    scope: str,
+) -> Optional[Rejection]:
+    """新任务加入后是否超出 limits; 队列为空时总是接受, 避免长音频永远无法提交"""
+    if limits.tasks and tasks >= limits.tasks:
+        # 需要先处理完超出的任务, 按平均时长换算成音频秒数
+        average = queued_seconds / tasks if tasks else 0.0
+        return Rejection(
+            scope,
+            f"{SCOPE_NAMES[scope]}排队任务数已达上限 {limits.tasks}",
+            retry_after(stats, (tasks - limits.tasks + 1) * average),
+        )
+    if (
+        limits.audio_seconds
+        and queued_seconds > 0
+        and (queued_seconds + audio_seconds > limits.audio_seconds)
+    ):
+        return Rejection(
+            scope,
+            f"{SCOPE_NAMES[scope]}排队音频时长已达上限 {limits.audio_seconds:g} 秒",
+            retry_after(stats, queued_seconds + audio_seconds - limits.audio_seconds),
+        )
+    return None
+
+
+def check(
+    stats: Dict, client_id: Optional[str], audio_seconds: float = 0.0
+) -> Optional[Rejection]:
+    """
+    检查是否接受时长为 audio_seconds 的新任务
+    stats 由 db.fetch_queue_stats 返回; 接受时返回 None
+    """
+    queued = stats["by_priority"].values()
+    rejection = over_limit(
+        Limits(ADMISSION_MAX_QUEUED_TASKS, ADMISSION_MAX_QUEUED_AUDIO_SECONDS),
+        sum(tasks for tasks, _ in queued),
+        sum(seconds for _, seconds in queued),
+        audio_seconds,
+        stats,
+        "service",
+    )
+    return rejection or over_limit(
+        client_limits(client_id),
+        stats["client_tasks"],
+        stats["client_audio_seconds"],
+        audio_seconds,
+        stats,
+        "client",
+    )
+
+
+def estimate_wait(stats: Dict, priority: int, audio_seconds: float) -> Optional[float]:
+    """
+    估计新任务从提交到完成的时间（秒）: 优先级不低于它的排队音频与它自身的音频
+    按当前处理速度处理完所需的时间; 没有历史数据时返回 None
+    """
+    rate = throughput(stats)
+    if rate is None:
+        return None
+    ahead = sum(
+        seconds
+        for level, (_, seconds) in stats["by_priority"].items()
+        if level >= priority
+    )
+    return (ahead + audio_seconds) / rate
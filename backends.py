@@ -0,0 +1,157 @@
+"""
+推理后端接口
+
+worker 通过后端完成说话人分离和语音识别:
+
+- diarize(waveform, sample_rate): 返回 [{"speaker": "SPEAKER_00", "start": 0.0, "end": 5.0}, ...]
+- transcribe_batch(segments, sample_rate): 返回与 segments 一一对应的文本
+- prepare(segment, sample_rate) / transcribe_prepared(prepared, sample_rate): 把转录拆成
+  CPU 预处理和模型生成两步, worker 在生成当前片段时用后台线程提前准备之后的片段
+
+model 后端 (worker.ModelBackend) 使用 pyannote 和 GLM-ASR 模型; stub 后端不加载任何模型,
+按配置的延迟返回确定性的结果, 用于在任意机器上单独测试排队、数据库和 I/O 开销。
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+import torch
+
+import cancellation
+from timings import count, stage
+
+MODEL_NAMES = ("asr", "diarization")
+
+# stub 后端配置
+# 说话人分离切分的片段时长（秒）和说话人数
+STUB_SEGMENT_SECONDS = float(os.getenv("STUB_SEGMENT_SECONDS", "5"))
+STUB_SPEAKERS = int(os.getenv("STUB_SPEAKERS", "2"))
+# 模拟加载耗时（秒）
+STUB_LOAD_SECONDS = float(os.getenv("STUB_LOAD_SECONDS", "0"))
+# 模拟推理延迟: 每次调用的固定耗时（秒）+ 每秒音频的耗时（秒, 即实时率）
+STUB_DIARIZE_LATENCY = float(os.getenv("STUB_DIARIZE_LATENCY", "0"))
+STUB_DIARIZE_RTF = float(os.getenv("STUB_DIARIZE_RTF", "0"))
+STUB_ASR_LATENCY = float(os.getenv("STUB_ASR_LATENCY", "0"))
+STUB_ASR_RTF = float(os.getenv("STUB_ASR_RTF", "0"))
+
+
+class InferenceBackend:
+    """推理后端基类"""
+
+    name = "base"
+
+    def load(self, name: str):
+        """加载模型, name 为 asr 或 diarization"""
+        raise NotImplementedError
+
+    def status(self) -> Dict[str, Dict]:
+        """各模型的状态, 至少包含 state 字段"""
+        raise NotImplementedError
+
+    def set_status(self, name: str, state: str, **fields):
+        raise NotImplementedError
+
+    def diarize(self, waveform: torch.Tensor, sample_rate: int) -> List[Dict]:
+        """说话人分离, waveform 形状为 (1, samples)"""
+        raise NotImplementedError
+
+    def transcribe_batch(
+        self, segments: List[torch.Tensor], sample_rate: int
+    ) -> List[str]:
+        """转录一批音频片段"""
+        raise NotImplementedError
+
+    def prepare(self, segment: torch.Tensor, sample_rate: int) -> Any:
+        """转录前的预处理, 可在其他线程中提前执行; 默认不做预处理"""
+        return segment
+
+    def transcribe_prepared(self, prepared: List[Any], sample_rate: int) -> List[str]:
+        """转录 prepare() 的结果"""
+        return self.transcribe_batch(prepared, sample_rate)
+
+
+class StubBackend(InferenceBackend):
+    """
+    不加载模型的确定性后端
+    说话人分离按固定时长切分并轮流分配说话人; 转录结果由片段时长和内容哈希决定,
+    相同输入总是得到相同输出。延迟用 sleep 模拟, 不占用 CPU, 任务取消时立即结束
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        segment_seconds: float = STUB_SEGMENT_SECONDS,
+        speakers: int = STUB_SPEAKERS,
+        load_seconds: float = STUB_LOAD_SECONDS,
+        diarize_latency: float = STUB_DIARIZE_LATENCY,
+        diarize_rtf: float = STUB_DIARIZE_RTF,
+        asr_latency: float = STUB_ASR_LATENCY,
+        asr_rtf: float = STUB_ASR_RTF,
+    ):
+        self.segment_seconds = segment_seconds
+        self.speakers = max(speakers, 1)
+        self.load_seconds = load_seconds
+        self.diarize_latency = diarize_latency
+        self.diarize_rtf = diarize_rtf
+        self.asr_latency = asr_latency
+        self.asr_rtf = asr_rtf
+        self._lock = threading.Lock()
+        self.model_status = {name: {"state": "unloaded"} for name in MODEL_NAMES}
+
+    def load(self, name: str):
+        if self.model_status[name]["state"] == "ready":
+            return
+        self.set_status(name, "loading")
+        time.sleep(self.load_seconds)
+        self.set_status(name, "ready", load_seconds=self.load_seconds)
+
+    def status(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: dict(status) for name, status in self.model_status.items()}
+
+    def set_status(self, name: str, state: str, **fields):
+        with self._lock:
+            self.model_status[name].update(state=state, **fields)
+
+    def diarize(self, waveform: torch.Tensor, sample_rate: int) -> List[Dict]:
+        self.load("diarization")
+        duration = waveform.shape[-1] / sample_rate
+        cancellation.sleep(self.diarize_latency + self.diarize_rtf * duration)
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.segment_seconds, duration)
+            segments.append(
+                {
+                    "speaker": f"SPEAKER_{len(segments) % self.speakers:02d}",
+                    "start": start,
+                    "end": end,
+                }
+            )
+            start = end
+        return segments
+
+    def transcribe_batch(
+        self, segments: List[torch.Tensor], sample_rate: int
+    ) -> List[str]:
+        self.load("asr")
+        durations = [segment.shape[-1] / sample_rate for segment in segments]
+        with stage("generate"):
+            cancellation.sleep(
+                self.asr_latency * len(segments) + self.asr_rtf * sum(durations)
+            )
+
+        texts = []
+        for segment, duration in zip(segments, durations):
+            digest = hashlib.sha1(segment.contiguous().numpy().tobytes()).hexdigest()[
+                :8
+            ]
+            text = f"stub transcript {duration:.2f}s {digest}"
+            count("tokens", len(text.split()))
+            texts.append(text)
+        return texts
@@ -0,0 +1 @@
+"""性能基准测试, 在仓库根目录下以 python -m bench.<name> 运行"""
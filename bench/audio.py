@@ -0,0 +1,106 @@
+"""
+合成多说话人音频
+
+每个说话人是一个带谐波的基频 (男声/女声音域), 按音节节奏做幅度调制,
+说话人轮流发言, 轮次之间插入短暂停顿, 并叠加少量噪声。生成结果是确定性的
+(由 seed 决定), 不需要下载任何数据:
+
+    python -m bench.audio --seconds 120 --speakers 3 --output /tmp/synthetic.wav
+"""
+
+import argparse
+import wave
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# 各说话人的基频（Hz）, 按顺序分配
+SPEAKER_PITCHES = (110.0, 210.0, 150.0, 250.0, 95.0, 180.0)
+
+
+def synthesize(
+    seconds: float,
+    speakers: int = 2,
+    turn_seconds: float = 4.0,
+    pause_seconds: float = 0.3,
+    sample_rate: int = SAMPLE_RATE,
+    seed: int = 0,
+) -> Tuple[np.ndarray, List[Dict]]:
+    """
+    生成多说话人音频
+    返回: (float32 单声道波形, [{"speaker": "SPEAKER_00", "start": 0.0, "end": 3.7}, ...])
+    """
+    rng = np.random.RandomState(seed)
+    total = int(seconds * sample_rate)
+    audio = np.zeros(total, dtype=np.float32)
+    turns = []
+
+    position = 0
+    turn = 0
+    while position < total:
+        speaker = turn % speakers
+        # 轮次时长在 turn_seconds 上下浮动
+        length = int(turn_seconds * rng.uniform(0.6, 1.4) * sample_rate)
+        end = min(position + length, total)
+        t = np.arange(end - position) / sample_rate
+
+        pitch = SPEAKER_PITCHES[speaker % len(SPEAKER_PITCHES)] * rng.uniform(
+            0.95, 1.05
+        )
+        # 缓慢的音高起伏
+        phase = (
+            2
+            * np.pi
+            * np.cumsum(pitch * (1 + 0.05 * np.sin(2 * np.pi * 0.5 * t)))
+            / sample_rate
+        )
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        # 约 4 Hz 的音节包络
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) ** 0.5
+        audio[position:end] = 0.1 * voice * envelope
+
+        turns.append(
+            {
+                "speaker": f"SPEAKER_{speaker:02d}",
+                "start": position / sample_rate,
+                "end": end / sample_rate,
+            }
+        )
+        position = end + int(pause_seconds * sample_rate)
+        turn += 1
+
+    audio += 0.003 * rng.randn(total).astype(np.float32)
+    return audio, turns
+
+
+def write_wav(path: Path, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Path:
+    """写入 16 位 PCM wav 文件"""
+    pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+    return Path(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成多说话人音频")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument("--turn_seconds", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, required=True)
+    args = parser.parse_args()
+
+    audio, turns = synthesize(
+        args.seconds, args.speakers, args.turn_seconds, seed=args.seed
+    )
+    write_wav(Path(args.output), audio)
+    print(f"Wrote {args.output}: {args.seconds}s, {len(turns)} turns")
+
+
+if __name__ == "__main__":
+    main()
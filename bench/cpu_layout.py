@@ -0,0 +1,166 @@
+"""
+CPU 进程 x 线程布局基准
+
+对每种布局启动 P 个进程、每个进程 T 个 torch 线程, 各自反复转录同一段音频,
+统计整体吞吐 (每秒处理的音频秒数), 找出本机最优的 worker.py 启动参数:
+
+    python -m bench.cpu_layout --audio examples/example_zh.wav
+    python -m bench.cpu_layout --layouts 1x32,2x16,4x8 --pin_cores
+
+模型通过 worker.py 的 ModelManager 加载, 因此会遵循 ASR_WEIGHTS_MODE 等环境变量;
+进程数较多时建议设置 ASR_WEIGHTS_MODE=shared
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+
+def default_layouts(num_cores: int) -> List[Tuple[int, int]]:
+    """按 2 的幂枚举进程数, 线程数平分全部核心"""
+    layouts = []
+    processes = 1
+    while processes <= num_cores:
+        layouts.append((processes, num_cores // processes))
+        processes *= 2
+    return layouts
+
+
+def parse_layouts(value: str) -> List[Tuple[int, int]]:
+    """解析 "1x32,2x16" 形式的布局列表"""
+    layouts = []
+    for item in value.split(","):
+        processes, threads = item.lower().split("x")
+        layouts.append((int(processes), int(threads)))
+    return layouts
+
+
+def run_layout_process(audio_path, iterations, num_threads, cores, barrier, results):
+    """子进程: 加载模型, 与其他进程同时开始, 记录转录耗时"""
+    import torchaudio
+
+    import worker
+
+    worker.configure_cpu(num_threads, cores)
+    worker.model_manager.load_asr_model()
+
+    wav, sr = torchaudio.load(str(audio_path))
+    wav = wav[:1, :]
+    if sr != 16000:
+        wav = torchaudio.transforms.Resample(sr, 16000)(wav)
+        sr = 16000
+
+    # 先跑一次预热, 不计入耗时
+    worker.transcribe_segment(wav, sr)
+
+    barrier.wait()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        worker.transcribe_segment(wav, sr)
+    results.put(
+        {
+            "pid": os.getpid(),
+            "seconds": time.perf_counter() - start,
+            "audio_seconds": iterations * wav.shape[1] / sr,
+        }
+    )
+
+
+def bench_layout(audio_path, processes, threads, iterations, pin_cores) -> dict:
+    """运行一种布局, 返回吞吐统计"""
+    import worker
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(processes)
+    results = ctx.Queue()
+    layout = worker.plan_cpu_layout(processes, threads, pin_cores)
+
+    children = [
+        ctx.Process(
+            target=run_layout_process,
+            args=(
+                audio_path,
+                iterations,
+                item["threads"],
+                item["cores"],
+                barrier,
+                results,
+            ),
+        )
+        for item in layout
+    ]
+    for child in children:
+        child.start()
+    stats = [results.get() for _ in children]
+    for child in children:
+        child.join()
+
+    wall = max(s["seconds"] for s in stats)
+    audio_seconds = sum(s["audio_seconds"] for s in stats)
+    return {
+        "processes": processes,
+        "threads_per_process": threads,
+        "pin_cores": pin_cores,
+        "wall_seconds": round(wall, 3),
+        "audio_seconds": round(audio_seconds, 3),
+        # 每秒处理的音频秒数, 越大越好
+        "throughput": round(audio_seconds / wall, 3),
+        "real_time_factor": round(wall * processes / audio_seconds, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU 进程 x 线程布局基准")
+    parser.add_argument(
+        "--audio",
+        type=str,
+        default=str(Path(__file__).parent.parent / "examples" / "example_zh.wav"),
+    )
+    parser.add_argument(
+        "--layouts",
+        type=str,
+        default=None,
+        help="逗号分隔的 进程数x线程数, 默认按 2 的幂枚举",
+    )
+    parser.add_argument("--iterations", type=int, default=5, help="每个进程的转录次数")
+    parser.add_argument("--pin_cores", action="store_true", help="将进程绑定到 CPU 核")
+    parser.add_argument("--output", type=str, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    num_cores = len(os.sched_getaffinity(0))
+    layouts = (
+        parse_layouts(args.layouts) if args.layouts else default_layouts(num_cores)
+    )
+
+    results = []
+    for processes, threads in layouts:
+        print(f"Benchmarking {processes} processes x {threads} threads...")
+        result = bench_layout(
+            Path(args.audio), processes, threads, args.iterations, args.pin_cores
+        )
+        print(
+            f"  throughput {result['throughput']:.2f} audio s/s, "
+            f"wall {result['wall_seconds']:.2f}s"
+        )
+        results.append(result)
+
+    best = max(results, key=lambda r: r["throughput"])
+    report = {"num_cores": num_cores, "results": results, "best": best}
+    print(json.dumps(report, indent=2))
+    print(
+        f"\nBest layout: python worker.py --processes {best['processes']} "
+        f"--threads_per_process {best['threads_per_process']}"
+        + (" --pin_cores" if best["pin_cores"] else "")
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+端到端吞吐与延迟基准
+
+生成合成多说话人音频 (bench/audio.py), 以指定并发驱动:
+
+- inference: 直接调用 inference.transcribe (模型只加载一次)
+- api: 在本进程内启动 service.py (嵌入模式, 数据库和上传目录放在临时目录),
+  通过 HTTP 上传并轮询任务结果
+
+输出 JSON: 实时率、各阶段耗时 (decode / diarize / features / prefetch / generate / db 等)、
+任务延迟 p50/p95/p99 和进程峰值 RSS。全程离线运行 (HF_HUB_OFFLINE=1),
+模型需已在本地; 设置 INFERENCE_BACKEND=stub 可在没有模型的机器上测试服务开销:
+
+    INFERENCE_BACKEND=stub STUB_ASR_RTF=0.05 python -m bench.e2e --target api --tasks 20 --concurrency 8
+    python -m bench.e2e --target inference --checkpoint_dir /path/to/GLM-ASR-Nano-2512 --seconds 30
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+from bench.audio import synthesize, write_wav
+
+STAGES = (
+    "decode",
+    "diarize",
+    "features",
+    "prefetch",
+    "prefetch_wait",
+    "generate",
+    "db",
+)
+# 任务的终止状态, 与 db.TaskStatus 一致
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+# ==================== 统计 ====================
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值的分位数, q 取 0-100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(max(values), 4) if values else 0.0,
+    }
+
+
+def summarize_stages(timings: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """各阶段的总耗时和每个任务的平均耗时（秒）"""
+    names = [s for s in STAGES if any(s in t for t in timings)]
+    names += sorted({s for t in timings for s in t} - set(names))
+    return {
+        name: {
+            "total": round(sum(t.get(name, 0.0) for t in timings), 4),
+            "mean_per_task": round(
+                sum(t.get(name, 0.0) for t in timings) / max(len(timings), 1), 4
+            ),
+        }
+        for name in names
+    }
+
+
+def peak_rss_mb() -> float:
+    """本进程的峰值常驻内存（MB）; Linux 上 ru_maxrss 的单位是 KB"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def build_report(target, results, wall_seconds, concurrency) -> Dict:
+    """
+    results: [{"latency": 秒, "audio_seconds": 秒, "timings": {...} 或 None, "ok": bool}, ...]
+    """
+    ok = [r for r in results if r["ok"]]
+    audio_seconds = sum(r["audio_seconds"] for r in ok)
+    return {
+        "target": target,
+        "backend": os.getenv("INFERENCE_BACKEND", "model"),
+        "tasks": len(results),
+        "failed": len(results) - len(ok),
+        "concurrency": concurrency,
+        "audio_seconds": round(audio_seconds, 2),
+        "wall_seconds": round(wall_seconds, 3),
+        # 每秒墙钟时间处理的音频秒数
+        "throughput_x_realtime": round(audio_seconds / wall_seconds, 3)
+        if wall_seconds
+        else 0.0,
+        # 单个任务的处理时长 / 音频时长
+        "rtf": summarize([r["latency"] / r["audio_seconds"] for r in ok]),
+        "latency_seconds": summarize([r["latency"] for r in ok]),
+        "stages_seconds": summarize_stages([r["timings"] for r in ok if r["timings"]]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# ==================== 测试音频 ====================
+
+
+def make_audio_files(
+    directory: Path, count: int, seconds: float, speakers: int
+) -> List[Path]:
+    """生成 count 个不同内容的合成音频文件"""
+    directory.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i in range(count):
+        audio, _ = synthesize(seconds, speakers, seed=i)
+        files.append(write_wav(directory / f"synthetic_{seconds:g}s_{i}.wav", audio))
+    return files
+
+
+def audio_duration(path: Path) -> float:
+    import wave
+
+    with wave.open(str(path)) as f:
+        return f.getnframes() / f.getframerate()
+
+
+# ==================== inference.transcribe ====================
+
+
+def bench_inference(
+    files: List[Path],
+    concurrency: int,
+    checkpoint_dir: Path,
+    device: str,
+    precision: str,
+    max_new_tokens: int,
+) -> Dict:
+    """并发调用 inference.transcribe, 共享同一个已加载的模型"""
+    from transformers import AutoTokenizer
+
+    import inference
+    from timings import StageTimer, activate
+
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir)
+    model = inference.load_model(checkpoint_dir, device, precision)
+    # 预热一次, 不计入结果
+    inference.transcribe(
+        checkpoint_dir,
+        files[0],
+        None,
+        max_new_tokens,
+        device,
+        precision,
+        model=model,
+        tokenizer=tokenizer,
+    )
+
+    def run(path: Path) -> Dict:
+        timer = StageTimer()
+        start = time.perf_counter()
+        try:
+            with activate(timer):
+                inference.transcribe(
+                    checkpoint_dir,
+                    path,
+                    None,
+                    max_new_tokens,
+                    device,
+                    precision,
+                    model=model,
+                    tokenizer=tokenizer,
+                )
+            ok = True
+        except Exception as e:
+            print(f"Transcription failed for {path}: {str(e)}", file=sys.stderr)
+            ok = False
+        return {
+            "latency": time.perf_counter() - start,
+            "audio_seconds": audio_duration(path),
+            "timings": timer.as_dict(),
+            "ok": ok,
+        }
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, files))
+    return build_report("inference", results, time.perf_counter() - start, concurrency)
+
+
+# ==================== HTTP API ====================
+
+
+def configure_environment(workdir: Path, workers: int):
+    """在导入 service / worker 之前调用: 隔离数据库和上传目录, 禁止联网下载模型"""
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.environ["DB_PATH"] = str(workdir / "bench.db")
+    os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+    os.environ["SERVICE_MODE"] = "embedded"
+    os.environ["WORKER_CONCURRENCY"] = str(workers)
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def running_service(ready_timeout: float = 600):
+    """在后台线程中启动 service.py, 等待 /ready 后返回 base_url"""
+    import requests
+    import uvicorn
+
+    import service
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(service.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, name="bench-service", daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + ready_timeout
+    while True:
+        try:
+            if server.started and requests.get(f"{base_url}/ready", timeout=5).ok:
+                break
+        except requests.ConnectionError:
+            pass
+        if time.monotonic() > deadline:
+            server.should_exit = True
+            raise TimeoutError("服务未能在超时时间内就绪")
+        time.sleep(0.2)
+
+    try:
+        yield base_url
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+
+
+def submit_and_wait(
+    base_url: str, path: Path, poll_interval: float, timeout: float
+) -> Dict:
+    """上传一个文件并轮询到任务结束, 各阶段耗时取自任务指标"""
+    import requests
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = requests.post(
+            f"{base_url}/api/tasks/upload", files={"file": (path.name, f, "audio/wav")}
+        )
+    response.raise_for_status()
+    task_id = response.json()["task_id"]
+    upload_seconds = time.perf_counter() - start
+
+    status = None
+    while time.perf_counter() - start < timeout:
+        status = requests.get(f"{base_url}/api/tasks/{task_id}").json()["status"]
+        if status in TERMINAL_STATUSES:
+            break
+        time.sleep(poll_interval)
+    latency = time.perf_counter() - start
+
+    metrics = (
+        requests.get(f"{base_url}/api/tasks/{task_id}", params={"include": "metrics"})
+        .json()
+        .get("metrics")
+    )
+    return {
+        "latency": latency,
+        "upload_seconds": upload_seconds,
+        "audio_seconds": audio_duration(path),
+        "timings": metrics["stages"] if metrics else None,
+        "ok": status == "completed",
+    }
+
+
+def bench_api(
+    base_url: str,
+    files: List[Path],
+    concurrency: int,
+    poll_interval: float = 0.05,
+    timeout: float = 3600,
+) -> Dict:
+    """以 concurrency 个客户端并发上传 files, 统计任务从上传到完成的延迟"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda path: submit_and_wait(base_url, path, poll_interval, timeout),
+                files,
+            )
+        )
+    wall_seconds = time.perf_counter() - start
+
+    report = build_report("api", results, wall_seconds, concurrency)
+    report["upload_seconds"] = summarize([r["upload_seconds"] for r in results])
+    return report
+
+
+# ==================== 入口 ====================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端吞吐与延迟基准")
+    parser.add_argument(
+        "--target", type=str, choices=("inference", "api"), default="api"
+    )
+    parser.add_argument("--tasks", type=int, default=8, help="任务（音频文件）数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发客户端数")
+    parser.add_argument(
+        "--seconds", type=float, default=30, help="每个音频的时长（秒）"
+    )
+    parser.add_argument("--speakers", type=int, default=2)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="api: 嵌入模式的 worker 线程数"
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=os.getenv("CHECKPOINT_DIR", str(Path(__file__).parent.parent)),
+    )
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument(
+        "--precision", type=str, default=os.getenv("ASR_PRECISION", "bf16")
+    )
+    parser.add_argument("--max_new_tokens", type=int, default=128)
+    parser.add_argument("--workdir", type=str, default=None, help="默认使用临时目录")
+    parser.add_argument("--output", type=str, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="glm-asr-bench-"))
+    files = make_audio_files(workdir / "audio", args.tasks, args.seconds, args.speakers)
+
+    if args.target == "inference":
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+        report = bench_inference(
+            files,
+            args.concurrency,
+            Path(args.checkpoint_dir),
+            args.device,
+            args.precision,
+            args.max_new_tokens,
+        )
+    else:
+        configure_environment(workdir, args.workers)
+        with running_service() as base_url:
+            report = bench_api(base_url, files, args.concurrency)
+
+    report["audio_seconds_per_task"] = args.seconds
+    report["speakers"] = args.speakers
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
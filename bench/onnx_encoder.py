@@ -0,0 +1,154 @@
+"""
+ONNX Runtime 音频编码器: 与 PyTorch 编码器的一致性校验和吞吐量对比
+
+对随机 mel 特征分别运行 PyTorch 编码器 (指定精度) 和 ONNX 编码器, 报告最大绝对误差、
+余弦相似度, 以及不同音频块数下每秒处理的音频块数:
+
+    python -m bench.onnx_encoder --checkpoint_dir /path/to/GLM-ASR-Nano-2512
+    python -m bench.onnx_encoder --batches 1,4 --precision fp32 --output onnx.json
+
+误差超出 --atol 时以非零状态退出, 可作为部署前的一致性检查。
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from acceleration import find_audio_encoder
+from inference import PRECISIONS, load_model, precision_dtype
+from onnx_encoder import (
+    ONNX_CACHE_DIR,
+    ONNX_PARITY_ATOL,
+    create_session,
+    dummy_features,
+    encoder_hidden_states,
+    encoder_path,
+    export_encoder,
+    fp32_encoder,
+)
+
+
+def check_parity(encoder, session, dtype, batch: int) -> dict:
+    """同一输入下两个编码器的输出差异"""
+    features = dummy_features(batch)
+    with torch.inference_mode():
+        expected = encoder_hidden_states(encoder(features.to(dtype))).float().numpy()
+    actual = session.run(None, {"input_features": features.numpy()})[0]
+    expected, actual = expected.reshape(-1), actual.reshape(-1)
+    cosine = float(
+        np.dot(expected, actual) / (np.linalg.norm(expected) * np.linalg.norm(actual))
+    )
+    return {
+        "batch": batch,
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "cosine": round(cosine, 6),
+    }
+
+
+def time_calls(fn, repeats: int) -> float:
+    """预热一次后平均每次调用的耗时（秒）"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def bench_throughput(encoder, session, dtype, batch: int, repeats: int) -> dict:
+    features = dummy_features(batch)
+    torch_input = features.to(dtype)
+    onnx_input = {"input_features": features.numpy()}
+
+    def run_torch():
+        with torch.inference_mode():
+            encoder(torch_input)
+
+    torch_seconds = time_calls(run_torch, repeats)
+    onnx_seconds = time_calls(lambda: session.run(None, onnx_input), repeats)
+    return {
+        "batch": batch,
+        "torch_chunks_per_second": round(batch / torch_seconds, 3),
+        "onnx_chunks_per_second": round(batch / onnx_seconds, 3),
+        "speedup": round(torch_seconds / onnx_seconds, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX 音频编码器一致性与吞吐量")
+    parser.add_argument(
+        "--checkpoint_dir", type=str, default=str(Path(__file__).parent.parent)
+    )
+    parser.add_argument("--cache_dir", type=str, default=str(ONNX_CACHE_DIR))
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=PRECISIONS,
+        default="fp32",
+        help="对比的 PyTorch 编码器精度",
+    )
+    parser.add_argument(
+        "--batches", type=str, default="1,2,4", help="逗号分隔的音频块数"
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--threads", type=int, default=0, help="0 表示使用 torch 默认值"
+    )
+    parser.add_argument("--atol", type=float, default=ONNX_PARITY_ATOL)
+    parser.add_argument("--output", type=str, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    checkpoint_dir = Path(args.checkpoint_dir)
+    model = load_model(checkpoint_dir, "cpu", args.precision)
+    parent, name = find_audio_encoder(model)
+    encoder = getattr(parent, name)
+
+    path = encoder_path(checkpoint_dir, Path(args.cache_dir))
+    if not path.exists():
+        export_encoder(fp32_encoder(model, checkpoint_dir), path, args.atol)
+    session = create_session(path, args.threads)
+    dtype = precision_dtype(args.precision)
+
+    batches = [int(b) for b in args.batches.split(",")]
+    parity = [check_parity(encoder, session, dtype, batch) for batch in batches]
+    throughput = [
+        bench_throughput(encoder, session, dtype, batch, args.repeats)
+        for batch in batches
+    ]
+
+    print(
+        f"{'batch':>5} {'max_diff':>10} {'cosine':>9} {'torch/s':>9} {'onnx/s':>9} {'speedup':>8}"
+    )
+    for p, t in zip(parity, throughput):
+        print(
+            f"{p['batch']:>5} {p['max_abs_diff']:>10.2e} {p['cosine']:>9.6f} "
+            f"{t['torch_chunks_per_second']:>9.3f} {t['onnx_chunks_per_second']:>9.3f} "
+            f"{t['speedup']:>7.2f}x"
+        )
+
+    result = {
+        "precision": args.precision,
+        "threads": torch.get_num_threads(),
+        "onnx_path": str(path),
+        "parity": parity,
+        "throughput": throughput,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    # 只有与 fp32 对比时误差才有意义, bf16 / int8 本身就有量化误差
+    if args.precision == "fp32" and any(p["max_abs_diff"] > args.atol for p in parity):
+        print(f"Parity check failed: max abs diff exceeds {args.atol:.0e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
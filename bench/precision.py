@@ -0,0 +1,203 @@
+"""
+ASR 推理精度对比: bf16 / fp32 / int8 动态量化
+
+对 examples/ 下的两段示例音频, 分别用各精度转录, 报告字错误率 (CER, 以
+README 中给出的转录结果为参考) 与速度, 用于按机型选择 ASR_PRECISION:
+
+    python -m bench.precision --checkpoint_dir /path/to/GLM-ASR-Nano-2512
+    python -m bench.precision --precisions fp32,int8 --repeats 5 --output precision.json
+"""
+
+import argparse
+import json
+import string
+import time
+from pathlib import Path
+
+import torch
+import torchaudio
+from transformers import AutoTokenizer, WhisperFeatureExtractor
+
+from inference import (
+    PRECISIONS,
+    WHISPER_FEAT_CFG,
+    build_prompt,
+    load_model,
+    precision_dtype,
+    prepare_inputs,
+)
+
+EXAMPLES_DIR = Path(__file__).parent.parent / "examples"
+
+# README 中给出的示例音频转录结果
+REFERENCES = {
+    "example_en.wav": (
+        "be careful not to allow fabric to become too hot which can cause "
+        "shrinkage or in extreme cases scorch"
+    ),
+    "example_zh.wav": "我还能再搞一个，就算是非常小的声音也能识别准确",
+}
+
+PUNCTUATION = set(string.punctuation) | set("，。！？、；：“”‘’（）《》…")
+
+
+def normalize(text: str) -> str:
+    """去掉标点和空白并转小写, 只比较字符内容"""
+    return "".join(
+        ch for ch in text.lower() if ch not in PUNCTUATION and not ch.isspace()
+    )
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein 编辑距离"""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        previous = current
+    return previous[-1]
+
+
+def character_error_rate(hypothesis: str, reference: str) -> float:
+    reference = normalize(reference)
+    return edit_distance(normalize(hypothesis), reference) / max(len(reference), 1)
+
+
+def transcribe_file(
+    model, tokenizer, feature_extractor, audio_path, device, dtype, max_new_tokens
+):
+    """转录单个文件, 返回 (文本, 生成耗时秒数)"""
+    batch = build_prompt(
+        audio_path,
+        tokenizer,
+        feature_extractor,
+        merge_factor=model.config.merge_factor,
+    )
+    model_inputs, prompt_len = prepare_inputs(batch, device, dtype)
+
+    start = time.perf_counter()
+    with torch.inference_mode():
+        generated = model.generate(
+            **model_inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+        )
+    seconds = time.perf_counter() - start
+
+    transcript_ids = generated[0, prompt_len:].cpu().tolist()
+    text = tokenizer.decode(transcript_ids, skip_special_tokens=True).strip()
+    return text, seconds
+
+
+def bench_precision(checkpoint_dir, precision, device, repeats, max_new_tokens) -> dict:
+    """加载指定精度的模型, 转录全部示例音频"""
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir)
+    feature_extractor = WhisperFeatureExtractor(**WHISPER_FEAT_CFG)
+
+    start = time.perf_counter()
+    model = load_model(checkpoint_dir, device, precision)
+    load_seconds = time.perf_counter() - start
+    dtype = precision_dtype(precision)
+
+    files = []
+    for name, reference in REFERENCES.items():
+        audio_path = EXAMPLES_DIR / name
+        wav, sr = torchaudio.load(str(audio_path))
+        audio_seconds = wav.shape[1] / sr
+        # 第一次运行用于预热, 不计时
+        text, _ = transcribe_file(
+            model,
+            tokenizer,
+            feature_extractor,
+            audio_path,
+            device,
+            dtype,
+            max_new_tokens,
+        )
+        timings = [
+            transcribe_file(
+                model,
+                tokenizer,
+                feature_extractor,
+                audio_path,
+                device,
+                dtype,
+                max_new_tokens,
+            )[1]
+            for _ in range(repeats)
+        ]
+        mean_seconds = sum(timings) / len(timings)
+        files.append(
+            {
+                "file": name,
+                "text": text,
+                "cer": round(character_error_rate(text, reference), 4),
+                "seconds": round(mean_seconds, 3),
+                "real_time_factor": round(mean_seconds / audio_seconds, 4),
+            }
+        )
+
+    del model
+    return {
+        "precision": precision,
+        "device": device,
+        "load_seconds": round(load_seconds, 2),
+        "mean_cer": round(sum(f["cer"] for f in files) / len(files), 4),
+        "mean_seconds": round(sum(f["seconds"] for f in files) / len(files), 3),
+        "files": files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASR 推理精度对比")
+    parser.add_argument(
+        "--checkpoint_dir", type=str, default=str(Path(__file__).parent.parent)
+    )
+    parser.add_argument(
+        "--precisions",
+        type=str,
+        default=",".join(PRECISIONS),
+        help="逗号分隔, 可选: " + ", ".join(PRECISIONS),
+    )
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--repeats", type=int, default=3, help="每个文件计时的转录次数")
+    parser.add_argument("--max_new_tokens", type=int, default=128)
+    parser.add_argument("--output", type=str, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    results = []
+    for precision in args.precisions.split(","):
+        print(f"Benchmarking {precision}...")
+        results.append(
+            bench_precision(
+                Path(args.checkpoint_dir),
+                precision,
+                args.device,
+                args.repeats,
+                args.max_new_tokens,
+            )
+        )
+
+    baseline = results[0]["mean_seconds"]
+    print(
+        f"\n{'precision':<10} {'CER':>8} {'seconds':>9} {'speedup':>8} {'load(s)':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['precision']:<10} {result['mean_cer']:>8.4f} "
+            f"{result['mean_seconds']:>9.3f} {baseline / result['mean_seconds']:>7.2f}x "
+            f"{result['load_seconds']:>8.2f}"
+        )
+        for f in result["files"]:
+            print(f"    {f['file']}: {f['text']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
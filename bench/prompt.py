@@ -0,0 +1,203 @@
+"""
+提示构造的微基准: 逐片段编码 vs 预编译的 PromptTemplate
+
+按固定随机种子生成 --segments 个 0.5-30 秒的片段时长, 分别用三种方式构造提示的
+input_ids / audio_offsets (不含 mel 特征提取), 报告每秒构造的片段数:
+
+- legacy: 原 build_prompt 的做法, 每个片段重新 tokenizer.encode 各固定部分, 并 eval 卷积配置
+- template: PromptTemplate, 每个片段单独构造
+- template_batch: PromptTemplate.batch, 每 --batch_size 个片段一起构造
+
+    python -m bench.prompt --checkpoint_dir /path/to/GLM-ASR-Nano-2512
+    python -m bench.prompt --segments 10000 --batch_size 32 --output prompt.json
+
+template 的结果与 legacy 逐 token 不一致时以非零状态退出。
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import torch
+from transformers import AutoConfig, AutoTokenizer
+
+from inference import PromptTemplate
+
+
+def legacy_audio_token_length(seconds, merge_factor=2):
+    """改为查表之前的 get_audio_token_length"""
+
+    def get_T_after_cnn(L_in, dilation=1):
+        for padding, kernel_size, stride in eval("[(1,3,1)] + [(1,3,2)] "):
+            L_out = L_in + 2 * padding - dilation * (kernel_size - 1) - 1
+            L_out = 1 + L_out // stride
+            L_in = L_out
+        return L_out
+
+    mel_len = int(seconds * 100)
+    audio_len_after_cnn = get_T_after_cnn(mel_len)
+    audio_token_num = (audio_len_after_cnn - merge_factor) // merge_factor + 1
+    return min(audio_token_num, 1500 // merge_factor)
+
+
+def legacy_prompt(tokenizer, seconds: float, merge_factor: int) -> dict:
+    """改为 PromptTemplate 之前 build_prompt_from_wav 中构造 token 的部分 (单个音频块)"""
+    tokens = []
+    tokens += tokenizer.encode("<|user|>")
+    tokens += tokenizer.encode("\n")
+    num_tokens = legacy_audio_token_length(seconds, merge_factor)
+    tokens += tokenizer.encode("<|begin_of_audio|>")
+    audio_offsets = [len(tokens)]
+    tokens += [0] * num_tokens
+    tokens += tokenizer.encode("<|end_of_audio|>")
+    tokens += tokenizer.encode("<|user|>")
+    tokens += tokenizer.encode("\nPlease transcribe this audio into text")
+    tokens += tokenizer.encode("<|assistant|>")
+    tokens += tokenizer.encode("\n")
+    return {
+        "input_ids": torch.tensor([tokens], dtype=torch.long),
+        "audio_offsets": [audio_offsets],
+        "audio_length": [[num_tokens]],
+        "attention_mask": torch.ones(1, len(tokens), dtype=torch.long),
+    }
+
+
+def segment_durations(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [round(rng.uniform(0.5, 30.0), 3) for _ in range(count)]
+
+
+def check_parity(
+    tokenizer, template: PromptTemplate, durations: list, batch_size: int
+) -> int:
+    """template 与 legacy 结果不一致的片段数 (批量构造时去掉左侧补齐后比较)"""
+    mismatches = 0
+    for start in range(0, len(durations), batch_size):
+        chunk = durations[start : start + batch_size]
+        batch = template.batch([[template.audio_token_count(s)] for s in chunk])
+        for row, seconds in enumerate(chunk):
+            expected = legacy_prompt(tokenizer, seconds, template.merge_factor)
+            mask = batch["attention_mask"][row].bool()
+            pad = int((~mask).sum())
+            if (
+                not torch.equal(batch["input_ids"][row][mask], expected["input_ids"][0])
+                or batch["audio_offsets"][row][0] - pad
+                != expected["audio_offsets"][0][0]
+                or batch["audio_length"][row] != expected["audio_length"][0]
+            ):
+                mismatches += 1
+    return mismatches
+
+
+def bench(fn, repeats: int) -> float:
+    """多次运行取最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(
+    tokenizer, merge_factor: int, segments: int, batch_size: int, repeats: int
+) -> dict:
+    durations = segment_durations(segments)
+
+    start = time.perf_counter()
+    template = PromptTemplate(tokenizer, merge_factor)
+    build_seconds = time.perf_counter() - start
+
+    def legacy():
+        for seconds in durations:
+            legacy_prompt(tokenizer, seconds, merge_factor)
+
+    def per_segment():
+        for seconds in durations:
+            template.batch([[template.audio_token_count(seconds)]])
+
+    def batched():
+        for i in range(0, len(durations), batch_size):
+            template.batch(
+                [[template.audio_token_count(s)] for s in durations[i : i + batch_size]]
+            )
+
+    results = {
+        "segments": segments,
+        "batch_size": batch_size,
+        "template_build_seconds": round(build_seconds, 4),
+        "mismatches": check_parity(tokenizer, template, durations, batch_size),
+        "modes": {},
+    }
+    for name, fn in (
+        ("legacy", legacy),
+        ("template", per_segment),
+        ("template_batch", batched),
+    ):
+        seconds = bench(fn, repeats)
+        results["modes"][name] = {
+            "seconds": round(seconds, 4),
+            "segments_per_second": round(segments / seconds, 1),
+        }
+    legacy_seconds = results["modes"]["legacy"]["seconds"]
+    for mode in results["modes"].values():
+        mode["speedup"] = round(legacy_seconds / mode["seconds"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示构造微基准")
+    parser.add_argument(
+        "--checkpoint_dir", type=str, default=str(Path(__file__).parent.parent)
+    )
+    parser.add_argument(
+        "--tokenizer_path", type=str, default=None, help="默认使用 checkpoint_dir"
+    )
+    parser.add_argument(
+        "--merge_factor",
+        type=int,
+        default=None,
+        help="默认读取模型配置中的 merge_factor",
+    )
+    parser.add_argument("--segments", type=int, default=10000)
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=str, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(
+        args.tokenizer_path or args.checkpoint_dir
+    )
+    merge_factor = (
+        args.merge_factor
+        or AutoConfig.from_pretrained(
+            args.checkpoint_dir, trust_remote_code=True
+        ).merge_factor
+    )
+    result = run(tokenizer, merge_factor, args.segments, args.batch_size, args.repeats)
+
+    print(
+        f"{result['segments']} segments, template built in {result['template_build_seconds']}s"
+    )
+    print(f"{'mode':>15} {'seconds':>9} {'segments/s':>12} {'speedup':>8}")
+    for name, mode in result["modes"].items():
+        print(
+            f"{name:>15} {mode['seconds']:>9.3f} {mode['segments_per_second']:>12.1f} "
+            f"{mode['speedup']:>7.2f}x"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if result["mismatches"]:
+        print(
+            f"Parity check failed: {result['mismatches']} segments differ from the legacy prompt"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
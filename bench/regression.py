@@ -0,0 +1,228 @@
+"""
+性能回归门禁
+
+通过 HTTP API 运行固定的一组场景, 与已提交的基线 JSON 按指标容差比较,
+打印对比表, 有指标回归时以非零状态退出:
+
+- short_segments: 多个短音频, 低并发
+- long_file: 单个 10 分钟长音频
+- upload_burst: 大量短音频同时上传
+
+    python -m bench.regression                      # 与 bench/baselines/<后端>.json 比较
+    python -m bench.regression --update             # 在参考机器上重新生成基线
+    INFERENCE_BACKEND=stub python -m bench.regression
+
+基线与运行环境相关: model 后端的基线应在固定的参考机器上生成并提交; stub 后端
+使用固定的模拟延迟, 只反映服务本身 (排队、数据库、I/O) 的开销。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from bench.e2e import (
+    bench_api,
+    configure_environment,
+    make_audio_files,
+    peak_rss_mb,
+    running_service,
+)
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# 场景: (任务数, 每个音频的时长（秒）, 并发客户端数)
+SCENARIOS = {
+    "short_segments": (8, 8, 2),
+    "long_file": (1, 600, 1),
+    "upload_burst": (32, 5, 32),
+}
+
+# 比较的指标: 报告中的路径 -> (方向, 默认相对容差, 绝对容差)
+# lower 表示越小越好, higher 表示越大越好; 变化量不超过绝对容差时视为噪声
+METRICS = {
+    "latency_seconds.p50": ("lower", 0.15, 0.05),
+    "latency_seconds.p95": ("lower", 0.25, 0.05),
+    "rtf.mean": ("lower", 0.15, 0.0),
+    "throughput_x_realtime": ("higher", 0.15, 0.0),
+    "stages_seconds.diarize.mean_per_task": ("lower", 0.20, 0.01),
+    "stages_seconds.generate.mean_per_task": ("lower", 0.15, 0.01),
+    "stages_seconds.db.mean_per_task": ("lower", 0.50, 0.02),
+    "upload_seconds.p95": ("lower", 0.50, 0.05),
+    "failed": ("lower", 0.0, 0.0),
+}
+PROCESS_METRICS = {
+    "peak_rss_mb": ("lower", 0.10, 50.0),
+}
+
+# stub 后端的固定模拟延迟, 保证不同机器上的结果可比
+STUB_ENV = {
+    "STUB_SEGMENT_SECONDS": "5",
+    "STUB_DIARIZE_LATENCY": "0.02",
+    "STUB_DIARIZE_RTF": "0.005",
+    "STUB_ASR_LATENCY": "0.01",
+    "STUB_ASR_RTF": "0.02",
+}
+
+
+def lookup(report: Dict, path: str):
+    """按 a.b.c 路径取值, 不存在时返回 None"""
+    value = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def run_scenarios(workdir: Path, workers: int) -> Dict:
+    """启动一次服务, 依次运行所有场景"""
+    configure_environment(workdir, workers)
+    results = {"backend": os.getenv("INFERENCE_BACKEND", "model"), "scenarios": {}}
+    with running_service() as base_url:
+        for name, (tasks, seconds, concurrency) in SCENARIOS.items():
+            print(
+                f"Running {name}: {tasks} x {seconds}s at concurrency {concurrency}..."
+            )
+            files = make_audio_files(workdir / name, tasks, seconds, speakers=2)
+            report = bench_api(base_url, files, concurrency)
+            results["scenarios"][name] = {
+                path: lookup(report, path)
+                for path in METRICS
+                if lookup(report, path) is not None
+            }
+    results["process"] = {"peak_rss_mb": peak_rss_mb()}
+    return results
+
+
+def compare_metric(
+    baseline, current, direction, tolerance, min_delta
+) -> Tuple[str, float]:
+    """返回 (状态, 相对变化), 相对变化以"变差"为正"""
+    if baseline == 0:
+        change = 0.0 if current == 0 else float("inf")
+    else:
+        change = (current - baseline) / baseline
+    worse = change if direction == "lower" else -change
+    if abs(current - baseline) <= min_delta:
+        return "ok", worse
+    if worse > tolerance:
+        return "REGRESSION", worse
+    if worse < -tolerance:
+        return "improved", worse
+    return "ok", worse
+
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """逐项比较, 基线中的 tolerances 可覆盖默认容差"""
+    # {"指标路径": 相对容差}
+    overrides = baseline.get("tolerances", {})
+    rows = []
+    sections = [(name, METRICS) for name in SCENARIOS] + [("process", PROCESS_METRICS)]
+    for section, metrics in sections:
+        base_values = (
+            baseline["process"]
+            if section == "process"
+            else baseline["scenarios"].get(section, {})
+        )
+        cur_values = (
+            current["process"]
+            if section == "process"
+            else current["scenarios"].get(section, {})
+        )
+        for path, (direction, tolerance, min_delta) in metrics.items():
+            if path not in base_values or path not in cur_values:
+                continue
+            tolerance = overrides.get(path, tolerance)
+            status, worse = compare_metric(
+                base_values[path], cur_values[path], direction, tolerance, min_delta
+            )
+            rows.append(
+                {
+                    "scenario": section,
+                    "metric": path,
+                    "baseline": base_values[path],
+                    "current": cur_values[path],
+                    "worse": worse,
+                    "tolerance": tolerance,
+                    "status": status,
+                }
+            )
+    return rows
+
+
+def print_table(rows: List[Dict]):
+    print(
+        f"\n{'scenario':<15} {'metric':<38} {'baseline':>10} {'current':>10} "
+        f"{'change':>9} {'tol':>6}  status"
+    )
+    for row in rows:
+        print(
+            f"{row['scenario']:<15} {row['metric']:<38} {row['baseline']:>10.4g} "
+            f"{row['current']:>10.4g} {row['worse']:>+8.1%} {row['tolerance']:>6.0%}  "
+            f"{row['status']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能回归门禁")
+    parser.add_argument(
+        "--baseline", type=str, default=None, help="默认 bench/baselines/<后端>.json"
+    )
+    parser.add_argument("--update", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument(
+        "--workers", type=int, default=2, help="嵌入模式的 worker 线程数"
+    )
+    parser.add_argument("--workdir", type=str, default=None, help="默认使用临时目录")
+    parser.add_argument(
+        "--output", type=str, default=None, help="本次结果 JSON 输出路径"
+    )
+    args = parser.parse_args()
+
+    backend = os.getenv("INFERENCE_BACKEND", "model")
+    if backend == "stub":
+        for key, value in STUB_ENV.items():
+            os.environ.setdefault(key, value)
+    baseline_path = Path(args.baseline or BASELINE_DIR / f"{backend}.json")
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="glm-asr-regression-"))
+    current = run_scenarios(workdir, args.workers)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.update:
+        # 保留基线中手工调整过的容差
+        if baseline_path.exists():
+            current["tolerances"] = json.loads(baseline_path.read_text()).get(
+                "tolerances", {}
+            )
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(current, indent=2) + "\n")
+        print(f"Baseline written to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"Baseline not found: {baseline_path}, run with --update first")
+        sys.exit(2)
+    baseline = json.loads(baseline_path.read_text())
+    if baseline.get("backend") != current["backend"]:
+        print(
+            f"Baseline backend {baseline.get('backend')!r} does not match {current['backend']!r}"
+        )
+        sys.exit(2)
+
+    rows = compare(baseline, current)
+    print_table(rows)
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed beyond tolerance")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
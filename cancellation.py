@@ -0,0 +1,65 @@
+"""
+任务取消
+
+worker 处理任务时为其创建一个 threading.Event 并用 activate() 设为当前线程的
+取消标志; 任务被取消时设置该标志, 调用链中的 check() / sleep() 和生成时的
+停止条件据此尽快结束, 抛出 TaskCancelled。没有激活的标志时这些函数不做任何事。
+
+    event = threading.Event()
+    with activate(event):
+        ...
+        check()  # 已取消时抛出 TaskCancelled
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+_local = threading.local()
+
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+
+
+def current() -> Optional[threading.Event]:
+    """当前线程处理的任务的取消标志"""
+    return getattr(_local, "event", None)
+
+
+@contextmanager
+def activate(event: threading.Event):
+    """在当前线程中激活取消标志"""
+    previous = current()
+    _local.event = event
+    try:
+        yield event
+    finally:
+        _local.event = previous
+
+
+def cancelled() -> bool:
+    event = current()
+    return event is not None and event.is_set()
+
+
+def check():
+    """当前任务已取消时抛出 TaskCancelled"""
+    if cancelled():
+        raise TaskCancelled()
+
+
+def hook(*args, **kwargs):
+    """用作进度回调 (如 pyannote 流水线的 hook), 当前任务已取消时抛出 TaskCancelled"""
+    check()
+
+
+def sleep(seconds: float):
+    """可被取消打断的 sleep"""
+    event = current()
+    if event is None:
+        time.sleep(seconds)
+        return
+    if event.wait(seconds):
+        raise TaskCancelled()
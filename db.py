@@ -0,0 +1,465 @@
+"""
+任务数据库访问层
+同步接口供后台处理线程使用, 异步端点通过 DBExecutor 在专用线程池中执行,
+避免 sqlite3 的阻塞调用占用事件循环
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from metrics import db_query_seconds
+
+# 配置
+DB_PATH = os.getenv("DB_PATH", "tasks.db")
+# 等待写锁的最长时间（秒）
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+# DB 线程池大小与排队上限, 超过上限的请求直接拒绝
+DB_WORKERS = int(os.getenv("DB_WORKERS", "4"))
+DB_MAX_QUEUE = int(os.getenv("DB_MAX_QUEUE", "256"))
+
+
+class TaskStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+@contextmanager
+def get_db():
+    """数据库连接上下文管理器"""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def init_db():
+    """初始化数据库"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # WAL 模式下读不阻塞写、写不阻塞读, 设置会持久化到数据库文件
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                error_message TEXT,
+                result TEXT,
+                metrics TEXT,
+                profile INTEGER NOT NULL DEFAULT 0,
+                priority INTEGER NOT NULL DEFAULT 0,
+                client_id TEXT,
+                audio_seconds REAL,
+                started_at TEXT,
+                progress TEXT,
+                preempted_for TEXT
+            )
+        """)
+        # 旧数据库升级: 补充后来新增的列
+        columns = {row["name"] for row in cursor.execute("PRAGMA table_info(tasks)")}
+        for column, definition in (
+            ("metrics", "TEXT"),
+            ("profile", "INTEGER NOT NULL DEFAULT 0"),
+            ("priority", "INTEGER NOT NULL DEFAULT 0"),
+            ("client_id", "TEXT"),
+            ("audio_seconds", "REAL"),
+            ("started_at", "TEXT"),
+            ("progress", "TEXT"),
+            ("preempted_for", "TEXT"),
+        ):
+            if column in columns:
+                continue
+            try:
+                cursor.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            except sqlite3.OperationalError as e:
+                # 多个进程同时升级时, 其他进程可能已经添加
+                if "duplicate column" not in str(e):
+                    raise
+
+        # list_tasks 的覆盖索引: 按 (created_at, task_id) 游标分页,
+        # 列表投影的字段全部在索引中, 无需回表
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_created
+            ON tasks (created_at DESC, task_id DESC, filename, status, updated_at)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_status_created
+            ON tasks (status, created_at DESC, task_id DESC, filename, updated_at)
+        """)
+        # 调度器按客户端统计近期已处理的音频时长
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_tasks_started
+            ON tasks (started_at, client_id, audio_seconds)
+        """)
+
+        # 按状态维护的任务计数, 由触发器更新, 用于不扫表的总数估计
+        # API 与 worker 进程可能同时升级同一个旧数据库: 建表、建触发器和回填在同一个
+        # 写事务中完成, 回填只执行一次, 回填之后写入的任务也都由触发器计数
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS task_counts (
+                status TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_count_insert
+            AFTER INSERT ON tasks
+            BEGIN
+                INSERT INTO task_counts (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT(status) DO UPDATE SET count = count + 1;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_count_update
+            AFTER UPDATE OF status ON tasks
+            WHEN OLD.status != NEW.status
+            BEGIN
+                UPDATE task_counts SET count = count - 1 WHERE status = OLD.status;
+                INSERT INTO task_counts (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT(status) DO UPDATE SET count = count + 1;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_tasks_count_delete
+            AFTER DELETE ON tasks
+            BEGIN
+                UPDATE task_counts SET count = count - 1 WHERE status = OLD.status;
+            END
+        """)
+        cursor.execute("SELECT COUNT(*) FROM task_counts")
+        if cursor.fetchone()[0] == 0:
+            # 旧数据库升级时一次性回填 (计数表为空说明尚未回填)
+            cursor.execute("""
+                INSERT INTO task_counts (status, count)
+                SELECT status, COUNT(*) FROM tasks GROUP BY status
+            """)
+
+        # worker 进程的心跳与就绪状态
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                heartbeat_at TEXT NOT NULL
+            )
+        """)
+
+
+def encode_cursor(created_at: str, task_id: str) -> str:
+    """将分页位置编码为不透明的游标"""
+    raw = json.dumps([created_at, task_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析游标, 返回 (created_at, task_id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("无效的 cursor")
+    if not isinstance(created_at, str) or not isinstance(task_id, str):
+        raise ValueError("无效的 cursor")
+    return created_at, task_id
+
+
+# ==================== 查询 ====================
+
+
+def insert_task(
+    task_id: str,
+    filename: str,
+    file_path: str,
+    status: str,
+    now: str,
+    profile: bool = False,
+    priority: int = 0,
+    client_id: Optional[str] = None,
+    audio_seconds: Optional[float] = None,
+):
+    """
+    创建任务记录
+    profile 表示处理时开启性能剖析; priority 越大越先处理, 同优先级内按 client_id 公平调度;
+    audio_seconds 为上传时估计的音频时长
+    """
+    with get_db() as conn:
+        conn.execute(
+            """INSERT INTO tasks
+               (task_id, filename, file_path, status, created_at, updated_at,
+                profile, priority, client_id, audio_seconds)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                task_id,
+                filename,
+                file_path,
+                status,
+                now,
+                now,
+                int(profile),
+                priority,
+                client_id,
+                audio_seconds,
+            ),
+        )
+
+
+def fetch_task(task_id: str) -> Optional[Dict]:
+    """按 task_id 读取任务, 不存在时返回 None"""
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT * FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def query_tasks(
+    status: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    filename_prefix: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str], int]:
+    """
+    按创建时间倒序分页查询任务列表
+
+    返回: (任务列表, next_cursor, total_estimate)
+    cursor 无效时抛出 ValueError
+    """
+    conditions = []
+    params = []
+
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    if created_after:
+        conditions.append("created_at >= ?")
+        params.append(created_after)
+    if created_before:
+        conditions.append("created_at < ?")
+        params.append(created_before)
+    if filename_prefix:
+        conditions.append("substr(filename, 1, ?) = ?")
+        params.extend([len(filename_prefix), filename_prefix])
+    if cursor:
+        cursor_created_at, cursor_task_id = decode_cursor(cursor)
+        conditions.append("(created_at, task_id) < (?, ?)")
+        params.extend([cursor_created_at, cursor_task_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # 多取一条用于判断是否还有下一页
+    query = f"""
+        SELECT task_id, filename, status, created_at, updated_at
+        FROM tasks
+        {where}
+        ORDER BY created_at DESC, task_id DESC
+        LIMIT ? OFFSET ?
+    """
+
+    with get_db() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute(query, (*params, limit + 1, offset))
+        rows = db_cursor.fetchall()
+
+        # 总数估计: 读取触发器维护的计数表, 不扫描 tasks 表
+        # 带时间范围或文件名过滤时为上界
+        if status:
+            db_cursor.execute(
+                "SELECT count FROM task_counts WHERE status = ?", (status,)
+            )
+        else:
+            db_cursor.execute("SELECT SUM(count) FROM task_counts")
+        count_row = db_cursor.fetchone()
+        total_estimate = (count_row[0] if count_row else 0) or 0
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["task_id"])
+
+    return [dict(row) for row in rows], next_cursor, total_estimate
+
+
+def fetch_task_counts() -> Dict[str, int]:
+    """按状态的任务数, 读取触发器维护的计数表, 不扫描 tasks"""
+    with get_db() as conn:
+        rows = conn.execute("SELECT status, count FROM task_counts").fetchall()
+    return {row["status"]: row["count"] for row in rows}
+
+
+def cancel_task(task_id: str) -> Optional[Dict]:
+    """
+    取消待处理或处理中的任务
+    返回取消前的 status 和 file_path, 任务不存在时返回 None; 已结束的任务不做修改
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        row = cursor.execute(
+            "SELECT status, file_path FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if not row:
+            return None
+        if row["status"] in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+            cursor.execute(
+                "UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ?",
+                (TaskStatus.CANCELLED, datetime.now().isoformat(), task_id),
+            )
+    return dict(row)
+
+
+def fetch_queue_stats(client_id: Optional[str], sample: int = 50) -> Dict:
+    """
+    准入控制用的排队统计: 待处理与处理中的任务按优先级汇总的 (任务数, 音频秒数),
+    该客户端的排队量, 以及最近 sample 个完成任务的音频总时长和处理总耗时
+    """
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT priority,
+                      COUNT(*) AS tasks,
+                      COALESCE(SUM(audio_seconds), 0) AS audio_seconds,
+                      SUM(client_id IS ?) AS client_tasks,
+                      COALESCE(SUM(CASE WHEN client_id IS ? THEN audio_seconds END), 0)
+                          AS client_audio_seconds,
+                      SUM(status = ?) AS processing
+               FROM tasks
+               WHERE status IN (?, ?)
+               GROUP BY priority""",
+            (
+                client_id,
+                client_id,
+                TaskStatus.PROCESSING,
+                TaskStatus.PENDING,
+                TaskStatus.PROCESSING,
+            ),
+        ).fetchall()
+        recent = conn.execute(
+            """SELECT COALESCE(SUM(audio_seconds), 0) AS audio_seconds,
+                      COALESCE(SUM((julianday(updated_at) - julianday(started_at)) * 86400), 0)
+                          AS busy_seconds
+               FROM (
+                   SELECT audio_seconds, started_at, updated_at FROM tasks
+                   WHERE status = ? AND started_at IS NOT NULL AND audio_seconds IS NOT NULL
+                   ORDER BY created_at DESC
+                   LIMIT ?
+               )""",
+            (TaskStatus.COMPLETED, sample),
+        ).fetchone()
+    return {
+        "by_priority": {
+            row["priority"]: (row["tasks"], row["audio_seconds"]) for row in rows
+        },
+        "client_tasks": sum(row["client_tasks"] for row in rows),
+        "client_audio_seconds": sum(row["client_audio_seconds"] for row in rows),
+        "processing": sum(row["processing"] for row in rows),
+        "recent_audio_seconds": recent["audio_seconds"],
+        "recent_busy_seconds": recent["busy_seconds"],
+    }
+
+
+def record_worker_heartbeat(worker_id: str, status: str):
+    """记录 worker 心跳, status 为 JSON 格式的就绪状态"""
+    with get_db() as conn:
+        conn.execute(
+            """INSERT INTO workers (worker_id, status, heartbeat_at)
+               VALUES (?, ?, ?)
+               ON CONFLICT(worker_id) DO UPDATE
+               SET status = excluded.status, heartbeat_at = excluded.heartbeat_at""",
+            (worker_id, status, datetime.now().isoformat()),
+        )
+
+
+def fetch_live_workers(max_age_seconds: float) -> List[Dict]:
+    """读取最近 max_age_seconds 秒内有心跳的 worker"""
+    since = (datetime.now() - timedelta(seconds=max_age_seconds)).isoformat()
+    with get_db() as conn:
+        rows = conn.execute(
+            """SELECT worker_id, status, heartbeat_at FROM workers
+               WHERE heartbeat_at >= ?
+               ORDER BY worker_id""",
+            (since,),
+        ).fetchall()
+    return [
+        {
+            "worker_id": row["worker_id"],
+            "heartbeat_at": row["heartbeat_at"],
+            **json.loads(row["status"]),
+        }
+        for row in rows
+    ]
+
+
+# ==================== 异步执行器 ====================
+
+
+class DBBusyError(RuntimeError):
+    """DB 执行器排队已满"""
+
+
+class DBExecutor:
+    """
+    专用 DB 线程池
+
+    异步端点通过 run() 把同步的 sqlite3 调用交给线程池执行, 事件循环不会被
+    写锁等待阻塞。正在执行和排队的调用总数有上限, 超过上限时抛出 DBBusyError,
+    由调用方返回 503, 而不是让请求无限堆积。
+    """
+
+    def __init__(self, max_workers: int = DB_WORKERS, max_queue: int = DB_MAX_QUEUE):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="db"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    async def run(self, func, *args, **kwargs):
+        """在 DB 线程池中执行 func(*args, **kwargs) 并等待结果"""
+        if not self._slots.acquire(blocking=False):
+            raise DBBusyError("数据库繁忙，请稍后重试")
+
+        def timed():
+            # 只统计执行耗时, 不含排队
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                db_query_seconds.observe(
+                    time.perf_counter() - start, operation=func.__name__
+                )
+
+        try:
+            future = self._executor.submit(timed)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        """关闭线程池, 等待已提交的调用完成"""
+        self._executor.shutdown(wait=True)
+
+
+db_executor = DBExecutor()
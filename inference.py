@@ -1,4 +1,10 @@
 import argparse
+import glob
+import json
+import math
+import re
+import weakref
+from difflib import SequenceMatcher
 from pathlib import Path
 
 import torch
@@ -10,6 +16,8 @@ from transformers import (
     WhisperFeatureExtractor,
 )
 
+from timings import count, stage
+
 WHISPER_FEAT_CFG = {
     "chunk_length": 30,
     "feature_extractor_type": "WhisperFeatureExtractor",
@@ -26,22 +34,186 @@ WHISPER_FEAT_CFG = {
 }
 
 
-def get_audio_token_length(seconds, merge_factor=2):
+# Model precision modes: bf16 is the reference; fp32 avoids emulated bf16 on CPUs
+# without native support; int8 applies dynamic quantization to linear layers (CPU only).
+PRECISIONS = ("bf16", "fp32", "int8")
+
+
+def precision_dtype(precision: str) -> torch.dtype:
+    return torch.bfloat16 if precision == "bf16" else torch.float32
+
+
+def quantize_dynamic_int8(model):
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def load_model(checkpoint_dir: Path, device: str, precision: str = "bf16"):
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown precision {precision!r}, expected one of {PRECISIONS}"
+        )
+    if precision == "int8" and device != "cpu":
+        raise ValueError("int8 dynamic quantization is only supported on CPU.")
+
+    config = AutoConfig.from_pretrained(checkpoint_dir, trust_remote_code=True)
+    model = AutoModelForCausalLM.from_pretrained(
+        checkpoint_dir,
+        config=config,
+        torch_dtype=precision_dtype(precision),
+        trust_remote_code=True,
+    ).to(device)
+    if precision == "int8":
+        model = quantize_dynamic_int8(model)
+    model.eval()
+    return model
+
+
+# (padding, kernel_size, stride) of the audio encoder's convolutions
+AUDIO_CNN_LAYERS = ((1, 3, 1), (1, 3, 2))
+# Mel frames per second of audio (hop_length 160 at 16 kHz)
+MEL_FRAMES_PER_SECOND = 100
+# The whisper encoder sees at most 1500 frames after the convolutions
+MAX_AUDIO_FRAMES = 1500
+
+
+def audio_tokens_for_mel_len(mel_len: int, merge_factor: int = 2) -> int:
     def get_T_after_cnn(L_in, dilation=1):
-        for padding, kernel_size, stride in eval("[(1,3,1)] + [(1,3,2)] "):
+        for padding, kernel_size, stride in AUDIO_CNN_LAYERS:
             L_out = L_in + 2 * padding - dilation * (kernel_size - 1) - 1
             L_out = 1 + L_out // stride
             L_in = L_out
         return L_out
 
-    mel_len = int(seconds * 100)
     audio_len_after_cnn = get_T_after_cnn(mel_len)
     audio_token_num = (audio_len_after_cnn - merge_factor) // merge_factor + 1
 
     # TODO: current whisper model can't process longer sequence, maybe cut chunk in the future
-    audio_token_num = min(audio_token_num, 1500 // merge_factor)
+    return min(audio_token_num, MAX_AUDIO_FRAMES // merge_factor)
+
+
+def get_audio_token_length(seconds, merge_factor=2):
+    return audio_tokens_for_mel_len(int(seconds * MEL_FRAMES_PER_SECOND), merge_factor)
+
+
+class PromptTemplate:
+    """
+    The transcription prompt for one tokenizer, with the token IDs of its fixed pieces
+    encoded once and the audio token count of every chunk length precomputed:
+
+        <|user|>\n ( <|begin_of_audio|> [audio tokens] <|end_of_audio|> )* <|user|>\n<instruction><|assistant|>\n
+
+    Use prompt_template() to share one instance per tokenizer.
+    """
+
+    INSTRUCTION = "\nPlease transcribe this audio into text"
+
+    def __init__(self, tokenizer, merge_factor: int, max_chunk_seconds: int = 30):
+        self.merge_factor = merge_factor
+        self.prefix = tokenizer.encode("<|user|>") + tokenizer.encode("\n")
+        self.begin_audio = tokenizer.encode("<|begin_of_audio|>")
+        self.end_audio = tokenizer.encode("<|end_of_audio|>")
+        self.suffix = (
+            tokenizer.encode("<|user|>")
+            + tokenizer.encode(self.INSTRUCTION)
+            + tokenizer.encode("<|assistant|>")
+            + tokenizer.encode("\n")
+        )
+        # Audio tokens by mel frame count; longer chunks are capped at the last entry
+        self.audio_tokens = [
+            audio_tokens_for_mel_len(mel_len, merge_factor)
+            for mel_len in range(max_chunk_seconds * MEL_FRAMES_PER_SECOND + 1)
+        ]
+        # Rows with one chunk: prefix + begin and end + suffix around the audio tokens
+        self._head = torch.tensor(self.prefix + self.begin_audio, dtype=torch.long)
+        self._tail = torch.tensor(self.end_audio + self.suffix, dtype=torch.long)
+
+    def audio_token_count(self, seconds: float) -> int:
+        mel_len = int(seconds * MEL_FRAMES_PER_SECOND)
+        return self.audio_tokens[max(min(mel_len, len(self.audio_tokens) - 1), 0)]
+
+    def tokens(self, audio_lengths: list[int]) -> tuple[list[int], list[int]]:
+        """Token IDs of one prompt and the offset of each chunk's audio tokens."""
+        tokens = list(self.prefix)
+        offsets = []
+        for num_tokens in audio_lengths:
+            tokens += self.begin_audio
+            offsets.append(len(tokens))
+            tokens += [0] * num_tokens
+            tokens += self.end_audio
+        tokens += self.suffix
+        return tokens, offsets
+
+    def batch(self, audio_lengths: list[list[int]], pad_token_id: int = 0) -> dict:
+        """
+        input_ids / attention_mask / audio_offsets / audio_length of a left-padded batch,
+        one row per entry of `audio_lengths` (the audio token count of each chunk).
+        """
+        if all(len(lengths) == 1 for lengths in audio_lengths):
+            return self._batch_single_chunk(
+                [lengths[0] for lengths in audio_lengths], pad_token_id
+            )
+
+        rows = [self.tokens(lengths) for lengths in audio_lengths]
+        max_len = max(len(tokens) for tokens, _ in rows)
+        input_ids = torch.full((len(rows), max_len), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros(len(rows), max_len, dtype=torch.long)
+        audio_offsets = []
+        for row, (tokens, offsets) in enumerate(rows):
+            pad = max_len - len(tokens)
+            input_ids[row, pad:] = torch.tensor(tokens, dtype=torch.long)
+            attention_mask[row, pad:] = 1
+            audio_offsets.append([offset + pad for offset in offsets])
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "audio_offsets": audio_offsets,
+            "audio_length": [list(lengths) for lengths in audio_lengths],
+        }
+
+    def _batch_single_chunk(self, num_tokens: list[int], pad_token_id: int) -> dict:
+        # Every row is [pad] head [audio zeros] tail, right-aligned; built with index arithmetic
+        counts = torch.tensor(num_tokens, dtype=torch.long)
+        head, tail = len(self._head), len(self._tail)
+        lengths = head + counts + tail
+        max_len = int(lengths.max())
+        starts = max_len - lengths
+        columns = torch.arange(max_len)
+
+        input_ids = torch.full(
+            (len(num_tokens), max_len), pad_token_id, dtype=torch.long
+        )
+        audio_starts = starts + head
+        input_ids[(columns >= audio_starts[:, None]) & (columns < max_len - tail)] = 0
+        head_columns = starts[:, None] + torch.arange(head)
+        input_ids.scatter_(1, head_columns, self._head.expand(len(num_tokens), head))
+        input_ids[:, max_len - tail :] = self._tail
+        return {
+            "input_ids": input_ids,
+            "attention_mask": (columns >= starts[:, None]).long(),
+            "audio_offsets": [[offset] for offset in audio_starts.tolist()],
+            "audio_length": [[count] for count in num_tokens],
+        }
 
-    return audio_token_num
+
+_templates: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def prompt_template(tokenizer, merge_factor: int) -> PromptTemplate:
+    """The PromptTemplate of `tokenizer`, built on first use."""
+    by_merge_factor = _templates.setdefault(tokenizer, {})
+    if merge_factor not in by_merge_factor:
+        by_merge_factor[merge_factor] = PromptTemplate(tokenizer, merge_factor)
+    return by_merge_factor[merge_factor]
+
+
+def load_wav(audio_path: Path, sampling_rate: int) -> torch.Tensor:
+    wav, sr = torchaudio.load(str(audio_path))
+    wav = wav[:1, :]
+    if sr != sampling_rate:
+        wav = torchaudio.transforms.Resample(sr, sampling_rate)(wav)
+    return wav
 
 
 def build_prompt(
@@ -52,17 +224,37 @@ def build_prompt(
     chunk_seconds: int = 30,
 ) -> dict:
     audio_path = Path(audio_path)
-    wav, sr = torchaudio.load(str(audio_path))
-    wav = wav[:1, :]
-    if sr != feature_extractor.sampling_rate:
-        wav = torchaudio.transforms.Resample(sr, feature_extractor.sampling_rate)(wav)
+    with stage("decode"):
+        wav = load_wav(audio_path, feature_extractor.sampling_rate)
 
-    tokens = []
-    tokens += tokenizer.encode("<|user|>")
-    tokens += tokenizer.encode("\n")
+    with stage("features"):
+        return build_prompt_from_wav(
+            wav, tokenizer, feature_extractor, merge_factor, chunk_seconds
+        )
 
+
+def build_prompt_from_wav(
+    wav: torch.Tensor,
+    tokenizer,
+    feature_extractor: WhisperFeatureExtractor,
+    merge_factor: int,
+    chunk_seconds: int,
+) -> dict:
+    template = prompt_template(tokenizer, merge_factor)
+    features = audio_features(wav, feature_extractor, template, chunk_seconds)
+    batch = template.batch([features["audio_length"]])
+    batch["audios"] = features["audios"]
+    return batch
+
+
+def audio_features(
+    wav: torch.Tensor,
+    feature_extractor: WhisperFeatureExtractor,
+    template: PromptTemplate,
+    chunk_seconds: int,
+) -> dict:
+    """Mel features of each chunk of `wav` and their audio token counts, without a prompt."""
     audios = []
-    audio_offsets = []
     audio_length = []
     chunk_size = chunk_seconds * feature_extractor.sampling_rate
     for start in range(0, wav.shape[1], chunk_size):
@@ -75,85 +267,449 @@ def build_prompt(
         )["input_features"]
         audios.append(mel)
         seconds = chunk.shape[1] / feature_extractor.sampling_rate
-        num_tokens = get_audio_token_length(seconds, merge_factor)
-        tokens += tokenizer.encode("<|begin_of_audio|>")
-        audio_offsets.append(len(tokens))
-        tokens += [0] * num_tokens
-        tokens += tokenizer.encode("<|end_of_audio|>")
-        audio_length.append(num_tokens)
+        audio_length.append(template.audio_token_count(seconds))
 
     if not audios:
         raise ValueError("音频内容为空或加载失败。")
 
-    tokens += tokenizer.encode("<|user|>")
-    tokens += tokenizer.encode("\nPlease transcribe this audio into text")
-
-    tokens += tokenizer.encode("<|assistant|>")
-    tokens += tokenizer.encode("\n")
-
-    batch = {
-        "input_ids": torch.tensor([tokens], dtype=torch.long),
-        "audios": torch.cat(audios, dim=0),
-        "audio_offsets": [audio_offsets],
-        "audio_length": [audio_length],
-        "attention_mask": torch.ones(1, len(tokens), dtype=torch.long),
-    }
-    return batch
+    return {"audios": torch.cat(audios, dim=0), "audio_length": audio_length}
 
 
-def prepare_inputs(batch: dict, device: torch.device) -> tuple[dict, int]:
+def prepare_inputs(
+    batch: dict, device: torch.device, dtype: torch.dtype = torch.bfloat16
+) -> tuple[dict, int]:
     tokens = batch["input_ids"].to(device)
     attention_mask = batch["attention_mask"].to(device)
     audios = batch["audios"].to(device)
     model_inputs = {
         "inputs": tokens,
         "attention_mask": attention_mask,
-        "audios": audios.to(torch.bfloat16),
+        "audios": audios.to(dtype),
         "audio_offsets": batch["audio_offsets"],
         "audio_length": batch["audio_length"],
     }
     return model_inputs, tokens.size(1)
 
 
+# Long-form mode: instead of packing every 30 s chunk of a file into one prompt (one long
+# sequential generate, truncated by max_new_tokens), split the audio into overlapping
+# windows of at most one chunk, transcribe the windows as rows of a batch and stitch the
+# texts, dropping the words transcribed twice in each overlap.
+
+# Words of Latin script, or single characters of other scripts (CJK has no word spacing).
+# Punctuation is ignored when matching overlaps.
+_STITCH_UNIT = re.compile(r"[0-9A-Za-z\u00C0-\u024F']+|[^\W_]")
+
+
+def split_windows(
+    wav: torch.Tensor,
+    sampling_rate: int,
+    window_seconds: float = 30.0,
+    overlap_seconds: float = 5.0,
+) -> list[torch.Tensor]:
+    window = int(window_seconds * sampling_rate)
+    step = window - int(overlap_seconds * sampling_rate)
+    if step <= 0:
+        raise ValueError("overlap_seconds must be smaller than window_seconds.")
+    windows = []
+    start = 0
+    while True:
+        windows.append(wav[:, start : start + window])
+        if start + window >= wav.shape[1]:
+            return windows
+        start += step
+
+
+def stitch_pair(
+    left: str, right: str, overlap_fraction: float, min_match: int = 2
+) -> str:
+    """
+    Join two consecutive window transcripts. The longest run of words shared by the tail
+    of `left` and the head of `right` (each searched over roughly the share of text that
+    falls in the overlap) is kept once; words cut at the window edges are dropped with it.
+    """
+    left_units = list(_STITCH_UNIT.finditer(left))
+    right_units = list(_STITCH_UNIT.finditer(right))
+    # Speaking rate varies, so search twice the expected overlap
+    left_tail = left_units[
+        -(math.ceil(len(left_units) * overlap_fraction * 2) + min_match) :
+    ]
+    right_head = right_units[
+        : math.ceil(len(right_units) * overlap_fraction * 2) + min_match
+    ]
+    match = SequenceMatcher(
+        None,
+        [unit.group().lower() for unit in left_tail],
+        [unit.group().lower() for unit in right_head],
+        autojunk=False,
+    ).find_longest_match(0, len(left_tail), 0, len(right_head))
+    if match.size >= min_match:
+        left_end = left_tail[match.a + match.size - 1].end()
+        right_end = right_head[match.b + match.size - 1].end()
+        return left[:left_end] + right[right_end:]
+
+    left, right = left.rstrip(), right.lstrip()
+    if not left or not right:
+        return left + right
+    separator = " " if left[-1].isascii() and right[0].isascii() else ""
+    return left + separator + right
+
+
+def stitch_transcripts(
+    texts: list[str], window_seconds: float, overlap_seconds: float
+) -> str:
+    text = ""
+    for window_text in texts:
+        text = stitch_pair(text, window_text.strip(), overlap_seconds / window_seconds)
+    return text.strip()
+
+
+def transcribe_long_form(
+    wav: torch.Tensor,
+    model,
+    tokenizer,
+    feature_extractor: WhisperFeatureExtractor,
+    max_new_tokens: int,
+    device: str,
+    dtype: torch.dtype = torch.bfloat16,
+    window_seconds: float = 30.0,
+    overlap_seconds: float = 5.0,
+    batch_size: int = 8,
+) -> str:
+    if window_seconds > feature_extractor.chunk_length:
+        raise ValueError(
+            f"window_seconds must not exceed the {feature_extractor.chunk_length} s model chunk."
+        )
+    with stage("features"):
+        windows = split_windows(
+            wav, feature_extractor.sampling_rate, window_seconds, overlap_seconds
+        )
+        template = prompt_template(tokenizer, model.config.merge_factor)
+        features = [
+            audio_features(
+                window, feature_extractor, template, feature_extractor.chunk_length
+            )
+            for window in windows
+        ]
+
+    texts = []
+    for start in range(0, len(features), batch_size):
+        texts += generate_texts(
+            features[start : start + batch_size],
+            model,
+            tokenizer,
+            max_new_tokens,
+            device,
+            dtype,
+        )
+    return stitch_transcripts(texts, window_seconds, overlap_seconds)
+
+
+def generate_texts(
+    features: list[dict],
+    model,
+    tokenizer,
+    max_new_tokens: int,
+    device: str,
+    dtype: torch.dtype = torch.bfloat16,
+) -> list[str]:
+    """
+    Generate the audio_features() of several windows as one left-padded batch; returns one
+    transcript per window.
+    """
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+    template = prompt_template(tokenizer, model.config.merge_factor)
+    batch = template.batch([item["audio_length"] for item in features], pad_token_id)
+    batch["audios"] = torch.cat([item["audios"] for item in features], dim=0)
+    model_inputs, prompt_len = prepare_inputs(batch, device, dtype)
+    with stage("generate"), torch.inference_mode():
+        generated = model.generate(
+            **model_inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+        )
+    texts = []
+    for row in generated[:, prompt_len:].cpu().tolist():
+        row = [token for token in row if token != pad_token_id]
+        count("tokens", len(row))
+        texts.append(tokenizer.decode(row, skip_special_tokens=True).strip())
+    return texts
+
+
+# Batch mode: transcribe many files with the model loaded once. Decoding and feature
+# extraction run in DataLoader worker processes ahead of generation, prompts of several
+# files are generated together, and each finished file is appended to a JSONL output so
+# an interrupted run resumes where it stopped.
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".mp3", ".m4a", ".ogg", ".opus", ".webm"}
+
+
+def collect_inputs(spec: str) -> list[Path]:
+    """
+    Audio files named by `spec`: a directory (searched recursively), a manifest (.txt / .lst
+    with one path per line, or .jsonl with an "audio" field; relative paths are resolved
+    against the manifest's directory), a single audio file, or a glob pattern.
+    """
+    path = Path(spec)
+    if path.is_dir():
+        return sorted(
+            p for p in path.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS
+        )
+    if path.is_file() and path.suffix.lower() in (".txt", ".lst", ".jsonl"):
+        paths = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = Path(
+                json.loads(line)["audio"] if path.suffix.lower() == ".jsonl" else line
+            )
+            paths.append(entry if entry.is_absolute() else path.parent / entry)
+        return paths
+    if path.is_file():
+        return [path]
+    return sorted(Path(p) for p in glob.glob(spec, recursive=True))
+
+
+def completed_inputs(output_path: Path) -> set[str]:
+    """
+    Inputs transcribed by a previous run; failed files are retried. A last line cut off by
+    an interrupted write is removed so new records start on a line of their own.
+    """
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "text" in record:
+                done.add(record["audio"])
+    return done
+
+
+class FeatureDataset(torch.utils.data.Dataset):
+    """
+    Decodes one file and extracts its audio_features() (one per window in long-form mode);
+    the prompts are built per generated batch.
+    """
+
+    def __init__(
+        self,
+        paths: list[Path],
+        tokenizer,
+        feature_extractor: WhisperFeatureExtractor,
+        merge_factor: int,
+        long_form: bool = False,
+        window_seconds: float = 30.0,
+        overlap_seconds: float = 5.0,
+    ):
+        self.paths = paths
+        self.template = prompt_template(tokenizer, merge_factor)
+        self.feature_extractor = feature_extractor
+        self.long_form = long_form
+        self.window_seconds = window_seconds
+        self.overlap_seconds = overlap_seconds
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> dict:
+        path = self.paths[index]
+        sampling_rate = self.feature_extractor.sampling_rate
+        try:
+            wav = load_wav(path, sampling_rate)
+            if self.long_form:
+                windows = split_windows(
+                    wav, sampling_rate, self.window_seconds, self.overlap_seconds
+                )
+            else:
+                windows = [wav]
+            features = [
+                audio_features(
+                    window,
+                    self.feature_extractor,
+                    self.template,
+                    self.feature_extractor.chunk_length,
+                )
+                for window in windows
+            ]
+        except Exception as e:
+            return {"audio": str(path), "error": f"{type(e).__name__}: {e}"}
+        return {
+            "audio": str(path),
+            "audio_seconds": wav.shape[1] / sampling_rate,
+            "features": features,
+        }
+
+
+def transcribe_files(
+    paths: list[Path],
+    output_path: Path,
+    model,
+    tokenizer,
+    feature_extractor: WhisperFeatureExtractor,
+    max_new_tokens: int,
+    device: str,
+    dtype: torch.dtype = torch.bfloat16,
+    batch_size: int = 8,
+    num_workers: int = 2,
+    prefetch_factor: int = 2,
+    long_form: bool = False,
+    window_seconds: float = 30.0,
+    overlap_seconds: float = 5.0,
+) -> int:
+    """
+    Transcribe `paths` into `output_path` (JSONL, one record per file, appended as files
+    finish). Files already in the output are skipped. Returns the number of files written.
+    """
+    output_path = Path(output_path)
+    done = completed_inputs(output_path)
+    pending = [path for path in paths if str(path) not in done]
+    print(
+        f"{len(paths) - len(pending)} of {len(paths)} files already transcribed, {len(pending)} to go"
+    )
+    if not pending:
+        return 0
+
+    dataset = FeatureDataset(
+        pending,
+        tokenizer,
+        feature_extractor,
+        model.config.merge_factor,
+        long_form,
+        window_seconds,
+        overlap_seconds,
+    )
+    # At most num_workers * prefetch_factor files are decoded ahead of generation
+    loader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=None,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+    )
+
+    written = 0
+    rows = []  # (file item, window features) waiting to be generated
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        def write(record: dict):
+            nonlocal written
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            written += 1
+            print(
+                f"[{written}/{len(pending)}] {record['audio']}: {record.get('text', record.get('error'))}"
+            )
+
+        def generate_rows():
+            texts = generate_texts(
+                [features for _, features in rows],
+                model,
+                tokenizer,
+                max_new_tokens,
+                device,
+                dtype,
+            )
+            for (item, _), text in zip(rows, texts):
+                item["texts"].append(text)
+                if len(item["texts"]) == len(item["features"]):
+                    if long_form:
+                        text = stitch_transcripts(
+                            item["texts"], window_seconds, overlap_seconds
+                        )
+                    write(
+                        {
+                            "audio": item["audio"],
+                            "text": text,
+                            "audio_seconds": round(item["audio_seconds"], 3),
+                        }
+                    )
+            rows.clear()
+
+        for item in loader:
+            if "error" in item:
+                write(item)
+                continue
+            item["texts"] = []
+            for features in item["features"]:
+                rows.append((item, features))
+                if len(rows) == batch_size:
+                    generate_rows()
+        if rows:
+            generate_rows()
+    return written
+
+
 def transcribe(
     checkpoint_dir: Path,
     audio_path: Path,
     tokenizer_path: str,
     max_new_tokens: int,
     device: str,
+    precision: str = "bf16",
+    model=None,
+    tokenizer=None,
+    long_form: bool = False,
+    window_seconds: float = 30.0,
+    overlap_seconds: float = 5.0,
+    batch_size: int = 8,
 ):
-    tokenizer_source = tokenizer_path if tokenizer_path else checkpoint_dir
-    tokenizer = AutoTokenizer.from_pretrained(tokenizer_source)
+    # model / tokenizer may be passed in already loaded to avoid reloading them per call
+    if tokenizer is None:
+        tokenizer_source = tokenizer_path if tokenizer_path else checkpoint_dir
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_source)
     feature_extractor = WhisperFeatureExtractor(**WHISPER_FEAT_CFG)
 
-    config = AutoConfig.from_pretrained(checkpoint_dir, trust_remote_code=True)
-    model = AutoModelForCausalLM.from_pretrained(
-        checkpoint_dir,
-        config=config,
-        torch_dtype=torch.bfloat16,
-        trust_remote_code=True,
-    ).to(device)
-    model.eval()
+    if model is None:
+        model = load_model(checkpoint_dir, device, precision)
+
+    if long_form:
+        with stage("decode"):
+            wav = load_wav(Path(audio_path), feature_extractor.sampling_rate)
+        transcript = transcribe_long_form(
+            wav,
+            model,
+            tokenizer,
+            feature_extractor,
+            max_new_tokens,
+            device,
+            precision_dtype(precision),
+            window_seconds,
+            overlap_seconds,
+            batch_size,
+        )
+        print("----------")
+        print(transcript or "[Empty transcription]")
+        return transcript
 
     batch = build_prompt(
         audio_path,
         tokenizer,
         feature_extractor,
-        merge_factor=config.merge_factor,
+        merge_factor=model.config.merge_factor,
     )
 
-    model_inputs, prompt_len = prepare_inputs(batch, device)
+    model_inputs, prompt_len = prepare_inputs(batch, device, precision_dtype(precision))
 
-    with torch.inference_mode():
+    with stage("generate"), torch.inference_mode():
         generated = model.generate(
             **model_inputs,
             max_new_tokens=max_new_tokens,
             do_sample=False,
         )
     transcript_ids = generated[0, prompt_len:].cpu().tolist()
+    count("tokens", len(transcript_ids))
     transcript = tokenizer.decode(transcript_ids, skip_special_tokens=True).strip()
     print("----------")
     print(transcript or "[Empty transcription]")
+    return transcript
 
 
 def main():
@@ -161,7 +717,31 @@ def main():
     parser.add_argument(
         "--checkpoint_dir", type=str, default=str(Path(__file__).parent)
     )
-    parser.add_argument("--audio", type=str, required=True, help="Path to audio file.")
+    parser.add_argument("--audio", type=str, default=None, help="Path to audio file.")
+    parser.add_argument(
+        "--inputs",
+        type=str,
+        default=None,
+        help="Batch mode: directory, glob pattern or manifest (.txt/.lst/.jsonl) of audio files.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="transcripts.jsonl",
+        help="Batch mode: JSONL results, appended per file; existing results are skipped.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=2,
+        help="Batch mode: decoding / feature worker processes.",
+    )
+    parser.add_argument(
+        "--prefetch_factor",
+        type=int,
+        default=2,
+        help="Batch mode: files prefetched per worker.",
+    )
     parser.add_argument(
         "--tokenizer_path",
         type=str,
@@ -172,7 +752,54 @@ def main():
     parser.add_argument(
         "--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu"
     )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=PRECISIONS,
+        default="bf16",
+        help="bf16 (default), fp32, or int8 dynamic quantization (CPU only).",
+    )
+    parser.add_argument(
+        "--long_form",
+        action="store_true",
+        help="Transcribe overlapping windows as a batch and stitch them (for long audio).",
+    )
+    parser.add_argument("--window_seconds", type=float, default=30.0)
+    parser.add_argument("--overlap_seconds", type=float, default=5.0)
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=8,
+        help="Prompts generated together (long-form windows, or files in batch mode).",
+    )
     args = parser.parse_args()
+    if (args.audio is None) == (args.inputs is None):
+        parser.error("exactly one of --audio and --inputs is required")
+
+    if args.inputs:
+        tokenizer = AutoTokenizer.from_pretrained(
+            args.tokenizer_path or args.checkpoint_dir
+        )
+        paths = collect_inputs(args.inputs)
+        if not paths:
+            parser.error(f"no audio files found for --inputs {args.inputs}")
+        transcribe_files(
+            paths,
+            Path(args.output),
+            load_model(Path(args.checkpoint_dir), args.device, args.precision),
+            tokenizer,
+            WhisperFeatureExtractor(**WHISPER_FEAT_CFG),
+            args.max_new_tokens,
+            args.device,
+            precision_dtype(args.precision),
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            prefetch_factor=args.prefetch_factor,
+            long_form=args.long_form,
+            window_seconds=args.window_seconds,
+            overlap_seconds=args.overlap_seconds,
+        )
+        return
 
     transcribe(
         checkpoint_dir=Path(args.checkpoint_dir),
@@ -180,6 +807,11 @@ def main():
         tokenizer_path=args.tokenizer_path,
         max_new_tokens=args.max_new_tokens,
         device=args.device,
+        precision=args.precision,
+        long_form=args.long_form,
+        window_seconds=args.window_seconds,
+        overlap_seconds=args.overlap_seconds,
+        batch_size=args.batch_size,
     )
 
 
@@ -0,0 +1,274 @@
+"""
+Prometheus 格式的运行指标
+
+不依赖 prometheus_client: 指标在进程内累计, render() 输出 Prometheus 文本格式。
+service.py 的 /metrics 端点输出本进程的指标; api 模式下独立运行的 worker 进程
+可通过 WORKER_METRICS_PORT 单独暴露自己的指标。
+
+各速率类指标 (每秒片段数、每秒生成 token 数) 以计数器形式提供, 由 Prometheus 的
+rate() 计算。
+"""
+
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        escaped = (
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+        pairs.append(f'{key}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """指标基类: 按标签值分别记录"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} 需要标签 {self.labelnames}, 实际为 {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            (self.name, dict(zip(self.labelnames, key)), value) for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    """可任意设置的瞬时值"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            (self.name, dict(zip(self.labelnames, key)), value) for key, value in items
+        ]
+
+
+class Histogram(Metric):
+    """按上界分桶的分布, 输出累计桶计数、总和与总数"""
+
+    type = "histogram"
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets: Sequence[float] = ()
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [
+                (key, dict(state, buckets=list(state["buckets"])))
+                for key, state in self._values.items()
+            ]
+        samples = []
+        for key, state in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["buckets"]):
+                cumulative += count
+                samples.append(
+                    (
+                        f"{self.name}_bucket",
+                        {**labels, "le": format_value(bound)},
+                        cumulative,
+                    )
+                )
+            samples.append((f"{self.name}_sum", labels, state["sum"]))
+            samples.append((f"{self.name}_count", labels, state["count"]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+# 各类耗时的分桶上界（秒）
+TASK_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5)
+LOAD_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+# ==================== 服务 (service.py) ====================
+
+tasks_by_status = registry.register(
+    Gauge("asr_tasks", "按状态统计的任务数, pending 即排队深度", ["status"])
+)
+uploads_total = registry.register(Counter("asr_uploads_total", "上传的音频文件数"))
+upload_bytes_total = registry.register(
+    Counter("asr_upload_bytes_total", "上传的音频字节数")
+)
+uploads_rejected_total = registry.register(
+    Counter(
+        "asr_uploads_rejected_total", "因超出排队容量被拒绝 (429) 的上传数", ["scope"]
+    )
+)
+db_query_seconds = registry.register(
+    Histogram(
+        "asr_db_query_duration_seconds",
+        "API 端点的数据库查询耗时",
+        ["operation"],
+        DB_BUCKETS,
+    )
+)
+
+# ==================== 推理 (worker.py) ====================
+
+task_duration_seconds = registry.register(
+    Histogram(
+        "asr_task_duration_seconds",
+        "任务处理耗时（从领取到完成）",
+        ["status"],
+        TASK_BUCKETS,
+    )
+)
+stage_duration_seconds = registry.register(
+    Histogram(
+        "asr_stage_duration_seconds",
+        "每个任务各阶段的累计耗时",
+        ["stage"],
+        STAGE_BUCKETS,
+    )
+)
+segments_total = registry.register(Counter("asr_segments_total", "转录的语音片段数"))
+generated_tokens_total = registry.register(
+    Counter("asr_generated_tokens_total", "生成的 token 数")
+)
+audio_seconds_total = registry.register(
+    Counter("asr_audio_seconds_total", "处理的音频时长（秒）")
+)
+model_load_seconds = registry.register(
+    Histogram(
+        "asr_model_load_duration_seconds", "模型加载耗时", ["model"], LOAD_BUCKETS
+    )
+)
+task_timeouts_total = registry.register(
+    Counter("asr_task_timeouts_total", "超出时间预算的任务数", ["stage"])
+)
+worker_recycles_total = registry.register(
+    Counter("asr_worker_recycles_total", "超时后仍卡在推理中而被回收的 worker 数")
+)
+
+
+def observe_task(status: str, metrics: Dict):
+    """记录一个任务的处理指标 (worker 保存到数据库的 metrics)"""
+    task_duration_seconds.observe(metrics["total_seconds"], status=status)
+    for stage, seconds in metrics["stages"].items():
+        stage_duration_seconds.observe(seconds, stage=stage)
+    segments_total.inc(len(metrics["segments"]))
+    generated_tokens_total.inc(metrics["tokens_generated"])
+    audio_seconds_total.inc(metrics["audio_seconds"])
+
+
+# ==================== 独立的指标端口 ====================
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不输出每次抓取的访问日志
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """在后台线程中提供 /metrics, 供独立运行的 worker 进程使用"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
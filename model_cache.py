@@ -0,0 +1,73 @@
+"""
+模型派生缓存 (共享权重 / ONNX 编码器) 的公共工具
+
+缓存文件名带上模型目录内容的指纹, 更新模型文件后自动使用新的缓存,
+不会继续加载按旧权重导出的文件。导出在文件锁内进行并原子替换,
+多个 worker 进程同时启动时只导出一次, 也不会读到写了一半的缓存
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Callable
+
+# 参与指纹计算的文件: 权重与配置
+FINGERPRINT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".json")
+
+
+def checkpoint_fingerprint(checkpoint_dir: Path) -> str:
+    """
+    模型目录内容的短指纹, 由权重和配置文件的文件名、大小和修改时间计算
+    不读取文件内容, 大模型目录也能立即得到结果
+    """
+    digest = hashlib.sha256()
+    checkpoint_dir = Path(checkpoint_dir)
+    if checkpoint_dir.is_dir():
+        for path in sorted(checkpoint_dir.iterdir()):
+            if path.suffix not in FINGERPRINT_SUFFIXES or not path.is_file():
+                continue
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def cache_name(checkpoint_dir: Path) -> str:
+    """缓存文件名前缀: 模型目录名加内容指纹"""
+    name = Path(checkpoint_dir).resolve().name or "model"
+    return f"{name}-{checkpoint_fingerprint(checkpoint_dir)}"
+
+
+def locked_export(target: Path, export: Callable[[Path], None]) -> Path:
+    """
+    target (文件或目录) 不存在时调用 export(tmp) 写入临时路径, 再原子替换为 target
+    多个进程同时调用时通过文件锁保证只导出一次; export 抛出异常时清理临时路径
+    """
+    target = Path(target)
+    if target.exists():
+        return target
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target.with_name(target.name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if target.exists():
+            return target
+
+        tmp = target.with_name(target.name + ".tmp")
+        remove(tmp)
+        try:
+            export(tmp)
+        except BaseException:
+            remove(tmp)
+            raise
+        # 原子替换, 其他进程不会看到写了一半的文件
+        os.replace(tmp, target)
+    return target
+
+
+def remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    elif path.exists():
+        path.unlink()
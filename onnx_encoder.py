@@ -0,0 +1,233 @@
+"""
+ONNX Runtime 音频编码器 (CPU)
+
+把 GLM-ASR 的音频编码器导出为 ONNX, 推理时用 ONNX Runtime 的 CPU 执行器运行,
+解码器仍使用 PyTorch。编码器每个音频块的输入都是固定的 128 x 3000 mel,
+只有 batch 维 (音频块数) 是动态的。
+
+导出文件按模型目录及其内容指纹缓存, 导出后会与 PyTorch 编码器对比输出, 误差超出容差时报错。
+预先导出 (可选, 否则由第一个 worker 导出):
+
+    python onnx_encoder.py --checkpoint_dir /path/to/GLM-ASR-Nano-2512
+"""
+
+import argparse
+import copy
+import os
+from pathlib import Path
+
+import numpy as np
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+
+from acceleration import EncoderWrapper, find_audio_encoder
+from inference import WHISPER_FEAT_CFG, load_model
+from model_cache import cache_name, locked_export
+
+ONNX_CACHE_DIR = Path(os.getenv("ONNX_CACHE_DIR", "./onnx_cache"))
+# ONNX Runtime 算子内并行线程数, 0 表示使用 torch 当前的线程数
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+# 导出后与 PyTorch 编码器对比的最大绝对误差
+ONNX_PARITY_ATOL = float(os.getenv("ONNX_PARITY_ATOL", "1e-3"))
+
+OPSET_VERSION = 17
+
+
+def encoder_path(checkpoint_dir: Path, cache_dir: Path = ONNX_CACHE_DIR) -> Path:
+    """
+    导出文件路径, 按模型目录和目录内容指纹区分
+    编码器权重超过 2GB 时以外部数据形式保存在同一目录, 因此每个模型单独一个目录
+    """
+    name = cache_name(checkpoint_dir)
+    return Path(cache_dir) / f"{name}-audio-encoder" / "encoder.onnx"
+
+
+def dummy_features(batch: int = 1) -> torch.Tensor:
+    """一个或多个 30 秒音频块的 mel 特征"""
+    return torch.randn(
+        batch, WHISPER_FEAT_CFG["feature_size"], WHISPER_FEAT_CFG["nb_max_frames"]
+    )
+
+
+def encoder_hidden_states(output) -> torch.Tensor:
+    """从编码器输出 (张量 / 元组 / ModelOutput) 中取出隐藏状态"""
+    if isinstance(output, torch.Tensor):
+        return output
+    return output[0]
+
+
+class EncoderForExport(torch.nn.Module):
+    """只返回隐藏状态张量, 便于导出"""
+
+    def __init__(self, encoder: torch.nn.Module):
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, input_features):
+        return encoder_hidden_states(self.encoder(input_features))
+
+
+def has_quantized_modules(module: torch.nn.Module) -> bool:
+    return any(
+        type(m).__module__.startswith("torch.ao.nn.quantized") for m in module.modules()
+    )
+
+
+def fp32_encoder(model, checkpoint_dir: Path) -> torch.nn.Module:
+    """
+    取得 fp32 的 PyTorch 编码器用于导出
+    int8 动态量化的模块无法导出, 这时从模型目录重新加载 fp32 模型
+    """
+    parent, name = find_audio_encoder(model)
+    encoder = getattr(parent, name)
+    if has_quantized_modules(encoder):
+        print("Encoder is quantized, loading fp32 weights for ONNX export...")
+        fp32_model = load_model(checkpoint_dir, "cpu", "fp32")
+        parent, name = find_audio_encoder(fp32_model)
+        return getattr(parent, name)
+    return copy.deepcopy(encoder).float().eval()
+
+
+def compare_outputs(encoder: torch.nn.Module, session, batch: int = 2) -> float:
+    """对比 PyTorch 编码器与 ONNX 会话的输出, 返回最大绝对误差"""
+    features = dummy_features(batch)
+    with torch.inference_mode():
+        expected = encoder_hidden_states(encoder(features)).float().numpy()
+    actual = session.run(None, {"input_features": features.numpy()})[0]
+    if expected.shape != actual.shape:
+        raise ValueError(
+            f"ONNX 编码器输出形状不一致: {actual.shape} != {expected.shape}"
+        )
+    return float(np.abs(expected - actual).max())
+
+
+def export_encoder(
+    encoder: torch.nn.Module,
+    path: Path,
+    atol: float = ONNX_PARITY_ATOL,
+) -> Path:
+    """
+    将 fp32 编码器导出为 ONNX 并校验输出, 已存在时直接返回
+    多个进程同时调用时通过文件锁保证只导出一次
+    """
+
+    def export(tmp_dir: Path):
+        print(f"Exporting audio encoder to {path}...")
+        tmp_dir.mkdir()
+        tmp_path = tmp_dir / path.name
+        with torch.inference_mode():
+            torch.onnx.export(
+                EncoderForExport(encoder),
+                (dummy_features(1),),
+                str(tmp_path),
+                input_names=["input_features"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_features": {0: "batch"},
+                    "last_hidden_state": {0: "batch"},
+                },
+                opset_version=OPSET_VERSION,
+                dynamo=False,
+            )
+
+        max_diff = compare_outputs(encoder, create_session(tmp_path))
+        if max_diff > atol:
+            raise ValueError(f"ONNX 编码器输出误差 {max_diff:.2e} 超出容差 {atol:.0e}")
+        print(f"ONNX encoder parity check passed (max abs diff {max_diff:.2e})")
+
+    # 外部数据文件与 encoder.onnx 在同一目录, 整个目录一起导出和替换
+    locked_export(path.parent, export)
+    return path
+
+
+def create_session(path: Path, intra_op_threads: int = ONNX_INTRA_OP_THREADS):
+    """创建 CPU 执行器的 ONNX Runtime 会话"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise ImportError("ONNX 编码器需要安装 onnxruntime: pip install onnxruntime")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # 与 worker 进程的 CPU 线程配置保持一致
+    options.intra_op_num_threads = intra_op_threads or torch.get_num_threads()
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(
+        str(path), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+class OnnxEncoder(EncoderWrapper):
+    """
+    用 ONNX Runtime 执行的音频编码器, 替换模型中的 PyTorch 编码器
+    输出类型和 dtype 与原编码器一致; 带有额外参数的调用回退到 PyTorch
+    """
+
+    def __init__(self, encoder: torch.nn.Module, session, returns_tensor: bool):
+        super().__init__(encoder)
+        self.session = session
+        self.returns_tensor = returns_tensor
+
+    def forward(self, input_features, *args, **kwargs):
+        if args or any(v is not None for v in kwargs.values()):
+            return self.encoder(input_features, *args, **kwargs)
+
+        features = input_features.detach().to("cpu", torch.float32).numpy()
+        hidden = self.session.run(None, {"input_features": features})[0]
+        hidden = torch.from_numpy(hidden).to(
+            input_features.device, input_features.dtype
+        )
+        if self.returns_tensor:
+            return hidden
+        return BaseModelOutput(last_hidden_state=hidden)
+
+
+def enable_onnx_encoder(model, checkpoint_dir: Path, cache_dir: Path = ONNX_CACHE_DIR):
+    """将模型的音频编码器替换为 ONNX Runtime 实现 (仅 CPU)"""
+    parent, name = find_audio_encoder(model)
+    encoder = getattr(parent, name)
+
+    path = encoder_path(checkpoint_dir, cache_dir)
+    if not path.exists():
+        export_encoder(fp32_encoder(model, checkpoint_dir), path)
+
+    # 用一个音频块确定原编码器的输出类型
+    with torch.inference_mode():
+        param = next(encoder.parameters(), None)
+        dtype = (
+            param.dtype
+            if param is not None and param.is_floating_point()
+            else torch.float32
+        )
+        returns_tensor = isinstance(encoder(dummy_features(1).to(dtype)), torch.Tensor)
+
+    setattr(parent, name, OnnxEncoder(encoder, create_session(path), returns_tensor))
+    print(f"Audio encoder ({name}) running on ONNX Runtime: {path}")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 ONNX 音频编码器")
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=os.getenv("CHECKPOINT_DIR", str(Path(__file__).parent)),
+    )
+    parser.add_argument("--cache_dir", type=str, default=str(ONNX_CACHE_DIR))
+    parser.add_argument("--atol", type=float, default=ONNX_PARITY_ATOL)
+    args = parser.parse_args()
+
+    checkpoint_dir = Path(args.checkpoint_dir)
+    path = encoder_path(checkpoint_dir, Path(args.cache_dir))
+    if path.exists():
+        print(f"ONNX encoder already exists: {path}")
+        return
+
+    model = load_model(checkpoint_dir, "cpu", "fp32")
+    parent, name = find_audio_encoder(model)
+    export_encoder(getattr(parent, name), path, args.atol)
+    print(f"ONNX encoder ready: {path} ({path.stat().st_size / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+按任务的性能剖析
+
+对单个任务 (上传时 profile=true, 或按 PROFILE_SAMPLE_RATE 抽样) 在说话人分离和
+片段转录期间开启 torch profiler、tracemalloc 和 CUDA 显存记录, 产物写入上传文件
+旁的 <task_id>.profile/ 目录, 通过 /admin/tasks/{task_id}/profile 下载:
+
+- trace.json.gz: torch profiler 的 Chrome trace, 可用 chrome://tracing 或 Perfetto 打开
+- ops.txt: 按算子汇总的 CPU/CUDA 耗时与内存
+- tracemalloc.txt: 任务前后 Python 内存分配的差异, 按代码行排序
+- cuda_memory.pickle: CUDA 显存分配历史, 可用 https://pytorch.org/memory_viz 查看
+- summary.json: 各区段 (diarize / transcribe) 的耗时和内存峰值
+
+    with profile_task(artifact_dir(file_path), should_profile(requested)):
+        with section("diarize"):
+            ...
+
+与 timings.py 相同, 剖析器按线程激活, section() 在没有激活的剖析器时不做任何事。
+torch profiler 和 tracemalloc 都是进程级的, 同一进程同一时间只剖析一个任务,
+其他任务照常执行、不剖析。
+"""
+
+import json
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 未显式请求剖析的任务按该比例抽样, 0 表示不抽样
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# tracemalloc 记录的调用栈深度
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+# tracemalloc.txt 中输出的条目数
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "50"))
+
+# 可以通过管理端点下载的产物
+ARTIFACTS = (
+    "trace.json.gz",
+    "ops.txt",
+    "tracemalloc.txt",
+    "cuda_memory.pickle",
+    "summary.json",
+)
+
+_local = threading.local()
+# 同一进程同一时间只允许一个任务剖析
+_busy = threading.Lock()
+
+
+def artifact_dir(file_path: Path) -> Path:
+    """剖析产物目录: 与上传文件同目录, uploads/<task_id>.wav -> uploads/<task_id>.profile/"""
+    return Path(file_path).with_suffix(".profile")
+
+
+def should_profile(requested: bool) -> bool:
+    """显式请求的任务总是剖析, 其余按 PROFILE_SAMPLE_RATE 抽样"""
+    return requested or (
+        PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    )
+
+
+class TaskProfiler:
+    """一个任务的剖析会话, start() 与 stop() 之间的 torch 算子和内存分配都会被记录"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.sections: List[Dict] = []
+        self._profiler = None
+        self._snapshot = None
+        self._owns_tracemalloc = False
+        self._cuda = False
+
+    def start(self):
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        activities = [ProfilerActivity.CPU]
+        self._cuda = torch.cuda.is_available()
+        if self._cuda:
+            activities.append(ProfilerActivity.CUDA)
+            torch.cuda.memory._record_memory_history(max_entries=100000)
+        # 先启动 torch profiler: 首次启动会导入大量模块, 在 tracemalloc 下非常慢
+        self._profiler = profile(
+            activities=activities, record_shapes=True, profile_memory=True
+        )
+        self._profiler.__enter__()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def stop(self):
+        """停止剖析并写入产物, 写入失败只打印日志"""
+        import torch
+
+        try:
+            self._profiler.__exit__(None, None, None)
+            self._profiler.export_chrome_trace(str(self.directory / "trace.json.gz"))
+            sort_by = "self_cuda_time_total" if self._cuda else "self_cpu_time_total"
+            (self.directory / "ops.txt").write_text(
+                self._profiler.key_averages().table(sort_by=sort_by, row_limit=100)
+            )
+
+            stats = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            lines = [str(stat) for stat in stats[:PROFILE_TOP_ALLOCATIONS]]
+            (self.directory / "tracemalloc.txt").write_text("\n".join(lines) + "\n")
+
+            if self._cuda:
+                torch.cuda.memory._dump_snapshot(
+                    str(self.directory / "cuda_memory.pickle")
+                )
+
+            (self.directory / "summary.json").write_text(
+                json.dumps(
+                    {
+                        "sections": self.sections,
+                        # 本进程的峰值常驻内存; Linux 上 ru_maxrss 的单位是 KB
+                        "peak_rss_mb": round(
+                            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                        ),
+                    },
+                    indent=2,
+                )
+            )
+        except Exception as e:
+            print(f"Failed to write profile to {self.directory}: {str(e)}")
+        finally:
+            if self._cuda:
+                torch.cuda.memory._record_memory_history(enabled=None)
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+    @contextmanager
+    def section(self, name: str, **fields):
+        """记录一个区段的耗时与内存峰值, 并在 trace 中标注区段名"""
+        import torch
+        from torch.profiler import record_function
+
+        tracemalloc.reset_peak()
+        if self._cuda:
+            torch.cuda.reset_peak_memory_stats()
+        start = time.perf_counter()
+        try:
+            with record_function(name):
+                yield
+        finally:
+            entry = {
+                "name": name,
+                **fields,
+                "seconds": round(time.perf_counter() - start, 4),
+                "python_peak_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 2),
+            }
+            if self._cuda:
+                entry["cuda_peak_mb"] = round(
+                    torch.cuda.max_memory_allocated() / 2**20, 2
+                )
+            self.sections.append(entry)
+
+
+def current() -> Optional[TaskProfiler]:
+    """当前线程激活的剖析器"""
+    return getattr(_local, "profiler", None)
+
+
+@contextmanager
+def profile_task(directory: Path, enabled: bool = True):
+    """
+    在当前线程中对一个任务开启剖析, 产物写入 directory
+    enabled 为 False、本进程已有任务在剖析或剖析器启动失败时不做任何事
+    """
+    if not enabled:
+        yield None
+        return
+    if not _busy.acquire(blocking=False):
+        print(f"Another task is being profiled, skipping profile for {directory}")
+        yield None
+        return
+
+    try:
+        profiler = TaskProfiler(directory)
+        try:
+            profiler.start()
+        except Exception as e:
+            print(f"Failed to start profiler for {directory}: {str(e)}")
+            if profiler._owns_tracemalloc:
+                tracemalloc.stop()
+            yield None
+            return
+
+        _local.profiler = profiler
+        try:
+            yield profiler
+        finally:
+            _local.profiler = None
+            profiler.stop()
+    finally:
+        _busy.release()
+
+
+@contextmanager
+def section(name: str, **fields):
+    """将区段计入当前线程的剖析器, 没有激活的剖析器时不做任何事"""
+    profiler = current()
+    if profiler is None:
+        yield
+        return
+    with profiler.section(name, **fields):
+        yield
+
+
+def list_artifacts(directory: Path) -> List[Dict]:
+    """已生成的剖析产物"""
+    return [
+        {"name": name, "size": (directory / name).stat().st_size}
+        for name in ARTIFACTS
+        if (directory / name).is_file()
+    ]
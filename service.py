@@ -2,99 +2,95 @@
 语音识别服务 - 支持说话人分离和语音转文字
 包含任务上传和结果查询API
 """
+
+import asyncio
+import hmac
+import json
 import os
+import threading
+import time
 import uuid
-import json
+import wave
+from datetime import datetime, timedelta
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, List, Dict
-import sqlite3
-from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
 
 # 加载环境变量
 try:
     from dotenv import load_dotenv
+
     load_dotenv()
 except ImportError:
     pass  # python-dotenv 是可选的
 
-import torch
-import torchaudio
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
-from pyannote.audio import Pipeline
-from transformers import (
-    AutoConfig,
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    WhisperFeatureExtractor,
-)
 
-from inference import build_prompt, prepare_inputs, WHISPER_FEAT_CFG
+import admission
+import metrics
+import tracing
+
+# 注意: 本模块不导入 torch / transformers / pyannote,
+# 推理相关代码位于 worker.py, 仅在嵌入模式下按需导入
+from db import (
+    DBBusyError,
+    TaskStatus,
+    cancel_task,
+    db_executor,
+    fetch_live_workers,
+    fetch_queue_stats,
+    fetch_task,
+    fetch_task_counts,
+    init_db,
+    insert_task,
+    query_tasks,
+)
+from profiling import ARTIFACTS, artifact_dir, list_artifacts
 
 # 配置
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
-CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR", Path(__file__).parent))
-DB_PATH = os.getenv("DB_PATH", "tasks.db")
-DEVICE = os.getenv("DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
 SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
 SERVICE_PORT = int(os.getenv("SERVICE_PORT", "6006"))
+# 部署模式:
+#   embedded - API 进程内启动 worker 线程处理任务 (默认)
+#   api      - 只负责接收和查询任务, 由独立的 worker.py 进程处理
+SERVICE_MODE = os.getenv("SERVICE_MODE", "embedded")
+# 嵌入模式下进程内的 worker 线程数
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+# api 模式下, 超过该时间（秒）没有心跳的 worker 视为离线
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "15"))
+# 未指定优先级的任务按音频时长推导: 不超过该时长（秒）的短音频使用交互优先级,
+# 其余使用批处理优先级; 优先级越大越先处理
+PRIORITY_SHORT_AUDIO_SECONDS = float(os.getenv("PRIORITY_SHORT_AUDIO_SECONDS", "120"))
+PRIORITY_INTERACTIVE = int(os.getenv("PRIORITY_INTERACTIVE", "5"))
+PRIORITY_BATCH = int(os.getenv("PRIORITY_BATCH", "0"))
+# 无法读取 wav 头的文件按该码率（字节/秒）由文件大小估计时长, 默认约 128 kbps
+AUDIO_BYTES_PER_SECOND = float(os.getenv("AUDIO_BYTES_PER_SECOND", "16000"))
+# 管理端点 (/admin/...) 的访问令牌, 通过 X-Admin-Token 请求头传入; 为空时不校验
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 # 确保上传目录存在
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 app = FastAPI(title="语音识别服务", description="支持说话人分离的语音转文字服务")
 
-
-# ==================== 数据库模型 ====================
-
-class TaskStatus:
-    PENDING = "pending"
-    PROCESSING = "processing"
-    COMPLETED = "completed"
-    FAILED = "failed"
-
-
-@contextmanager
-def get_db():
-    """数据库连接上下文管理器"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
-
-
-def init_db():
-    """初始化数据库"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id TEXT PRIMARY KEY,
-                filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                status TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                error_message TEXT,
-                result TEXT
-            )
-        """)
+# 嵌入模式下的 worker 模块与线程, 启动时才导入
+inference_worker = None
+worker_stop_event = threading.Event()
 
 
 # ==================== API 模型 ====================
 
+
 class TaskResponse(BaseModel):
     task_id: str
     status: str
     message: str
+    priority: int
+    # 按最近的处理速度估计, 没有历史数据时为空
+    estimated_wait_seconds: Optional[float] = None
+    estimated_completion_at: Optional[str] = None
 
 
 class Speaker(BaseModel):
@@ -112,330 +108,233 @@ class TaskResult(BaseModel):
     updated_at: str
     error_message: Optional[str] = None
     speakers: Optional[List[Speaker]] = None
+    # 仅在 include=metrics 时返回
+    metrics: Optional[Dict[str, Any]] = None
 
 
-# ==================== 全局模型加载 ====================
-
-class ModelManager:
-    """模型管理器 - 单例模式"""
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-    
-    def __init__(self):
-        if self._initialized:
-            return
-        
-        self.tokenizer = None
-        self.feature_extractor = None
-        self.asr_model = None
-        self.diarization_pipeline = None
-        self._initialized = True
-    
-    def load_asr_model(self):
-        """加载ASR模型"""
-        if self.asr_model is not None:
-            return
-        
-        print("Loading ASR model...")
-        self.tokenizer = AutoTokenizer.from_pretrained(CHECKPOINT_DIR)
-        self.feature_extractor = WhisperFeatureExtractor(**WHISPER_FEAT_CFG)
-        
-        config = AutoConfig.from_pretrained(CHECKPOINT_DIR, trust_remote_code=True)
-        self.asr_model = AutoModelForCausalLM.from_pretrained(
-            CHECKPOINT_DIR,
-            config=config,
-            torch_dtype=torch.bfloat16,
-            trust_remote_code=True,
-        ).to(DEVICE)
-        self.asr_model.eval()
-        print("ASR model loaded successfully")
-    
-    def load_diarization_pipeline(self, auth_token: Optional[str] = None):
-        """加载说话人分离模型"""
-        if self.diarization_pipeline is not None:
-            return
-        
-        print("Loading diarization pipeline...")
-        # 需要 Hugging Face token 来访问 pyannote 模型
-        # 可以从环境变量获取: export HUGGINGFACE_TOKEN=your_token
-        token = auth_token or os.getenv("HUGGINGFACE_TOKEN") or os.getenv("HF_TOKEN")
-        if not token:
-            raise ValueError(
-                "需要 Hugging Face token 来访问 pyannote 模型。"
-                "请设置环境变量 HUGGINGFACE_TOKEN 或 HF_TOKEN。"
-                "获取token: https://huggingface.co/settings/tokens"
-            )
-        
-        self.diarization_pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
-            token=token
-        )
-        
-        if torch.cuda.is_available():
-            self.diarization_pipeline.to(torch.device(DEVICE))
-        
-        print("Diarization pipeline loaded successfully")
+# ==================== API 端点 ====================
 
 
-model_manager = ModelManager()
+@app.on_event("startup")
+async def startup_event():
+    """应用启动时初始化"""
+    global inference_worker
 
+    init_db()
+    print("Database initialized")
 
-# ==================== 核心处理函数 ====================
+    if SERVICE_MODE == "embedded":
+        import worker as inference_worker
 
-def diarize_audio(audio_path: Path) -> List[Dict]:
-    """
-    使用 pyannote-audio 进行说话人分离
-    返回: [{"speaker": "SPEAKER_00", "start": 0.0, "end": 5.0}, ...]
-    """
-    model_manager.load_diarization_pipeline()
-    
-    diarization = model_manager.diarization_pipeline(str(audio_path))
-    
-    segments = []
-    for turn, _, speaker in diarization.itertracks(yield_label=True):
-        segments.append({
-            "speaker": speaker,
-            "start": turn.start,
-            "end": turn.end
-        })
-    
-    return segments
-
-
-def extract_audio_segment(audio_path: Path, start: float, end: float) -> torch.Tensor:
-    """提取音频片段"""
-    wav, sr = torchaudio.load(str(audio_path))
-    wav = wav[:1, :]  # 转单声道
-    
-    # 转换为正确的采样率
-    if sr != 16000:
-        wav = torchaudio.transforms.Resample(sr, 16000)(wav)
-        sr = 16000
-    
-    # 提取片段
-    start_sample = int(start * sr)
-    end_sample = int(end * sr)
-    segment = wav[:, start_sample:end_sample]
-    
-    return segment, sr
-
-
-def transcribe_segment(audio_segment: torch.Tensor, sr: int) -> str:
-    """转录音频片段"""
-    model_manager.load_asr_model()
-    
-    # 保存临时音频文件
-    temp_path = UPLOAD_DIR / f"temp_{uuid.uuid4()}.wav"
-    torchaudio.save(str(temp_path), audio_segment, sr)
-    
-    try:
-        batch = build_prompt(
-            temp_path,
-            model_manager.tokenizer,
-            model_manager.feature_extractor,
-            merge_factor=model_manager.asr_model.config.merge_factor,
+        # 启用预加载时模型在后台加载和预热, 期间 /ready 返回 503
+        inference_worker.start_workers(WORKER_CONCURRENCY, worker_stop_event)
+        print(f"Service running on device: {inference_worker.DEVICE}")
+    else:
+        print(
+            f"Service running in {SERVICE_MODE} mode, tasks are processed by worker.py"
         )
-        
-        model_inputs, prompt_len = prepare_inputs(batch, DEVICE)
-        
-        with torch.inference_mode():
-            generated = model_manager.asr_model.generate(
-                **model_inputs,
-                max_new_tokens=256,
-                do_sample=False,
-            )
-        
-        transcript_ids = generated[0, prompt_len:].cpu().tolist()
-        transcript = model_manager.tokenizer.decode(
-            transcript_ids, skip_special_tokens=True
-        ).strip()
-        
-        return transcript or "[Empty]"
-    
-    finally:
-        # 清理临时文件
-        if temp_path.exists():
-            temp_path.unlink()
-
-
-def process_audio_task(task_id: str):
-    """处理音频任务的主函数"""
-    try:
-        # 更新任务状态为处理中
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ?",
-                (TaskStatus.PROCESSING, datetime.now().isoformat(), task_id)
-            )
-            
-            # 获取任务信息
-            cursor.execute("SELECT file_path FROM tasks WHERE task_id = ?", (task_id,))
-            row = cursor.fetchone()
-            if not row:
-                raise ValueError(f"Task {task_id} not found")
-            
-            file_path = Path(row["file_path"])
-        
-        # 步骤1: 说话人分离
-        print(f"Task {task_id}: Starting speaker diarization...")
-        diarization_segments = diarize_audio(file_path)
-        print(f"Task {task_id}: Found {len(diarization_segments)} speaker segments")
-        
-        # 步骤2: 对每个片段进行语音识别
-        results = []
-        for i, segment in enumerate(diarization_segments):
-            print(f"Task {task_id}: Transcribing segment {i+1}/{len(diarization_segments)}")
-            
-            # 提取音频片段
-            audio_segment, sr = extract_audio_segment(
-                file_path,
-                segment["start"],
-                segment["end"]
-            )
-            
-            # 转录
-            text = transcribe_segment(audio_segment, sr)
-            
-            results.append({
-                "speaker_id": segment["speaker"],
-                "start": segment["start"],
-                "end": segment["end"],
-                "text": text
-            })
-        
-        # 步骤3: 保存结果
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """UPDATE tasks 
-                   SET status = ?, updated_at = ?, result = ? 
-                   WHERE task_id = ?""",
-                (
-                    TaskStatus.COMPLETED,
-                    datetime.now().isoformat(),
-                    json.dumps(results, ensure_ascii=False),
-                    task_id
-                )
-            )
-        
-        print(f"Task {task_id}: Completed successfully")
-    
-    except Exception as e:
-        print(f"Task {task_id}: Failed with error: {str(e)}")
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """UPDATE tasks 
-                   SET status = ?, updated_at = ?, error_message = ? 
-                   WHERE task_id = ?""",
-                (
-                    TaskStatus.FAILED,
-                    datetime.now().isoformat(),
-                    str(e),
-                    task_id
-                )
-            )
 
 
-# ==================== API 端点 ====================
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放资源"""
+    worker_stop_event.set()
+    if inference_worker is not None:
+        inference_worker.task_available.set()
+    db_executor.shutdown()
 
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时初始化"""
-    init_db()
-    print("Database initialized")
-    print(f"Service running on device: {DEVICE}")
+
+@app.exception_handler(DBBusyError)
+async def db_busy_handler(request, exc: DBBusyError):
+    """DB 执行器排队已满时返回 503"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"},
+    )
+
+
+def save_upload(source, file_path: Path) -> int:
+    """将上传内容分块写入磁盘, 返回写入的字节数"""
+    size = 0
+    with open(file_path, "wb") as f:
+        while chunk := source.read(1024 * 1024):
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def estimate_audio_seconds(file_path: Path, size: int) -> float:
+    """估计音频时长: wav 读取文件头, 其他格式按文件大小和 AUDIO_BYTES_PER_SECOND 估计"""
+    try:
+        with wave.open(str(file_path)) as f:
+            return f.getnframes() / f.getframerate()
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return size / AUDIO_BYTES_PER_SECOND
+
+
+def derive_priority(audio_seconds: float) -> int:
+    """未指定优先级时, 短音频优先"""
+    if audio_seconds <= PRIORITY_SHORT_AUDIO_SECONDS:
+        return PRIORITY_INTERACTIVE
+    return PRIORITY_BATCH
+
+
+def reject_if_over_capacity(rejection: Optional[admission.Rejection]):
+    """超出排队容量时返回 429"""
+    if rejection is None:
+        return
+    metrics.uploads_rejected_total.inc(scope=rejection.scope)
+    raise HTTPException(
+        status_code=429,
+        detail=rejection.reason,
+        headers={"Retry-After": str(rejection.retry_after)},
+    )
 
 
 @app.post("/api/tasks/upload", response_model=TaskResponse)
 async def upload_audio_task(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(..., description="音频文件 (支持 wav, mp3, m4a 等格式)")
+    request: Request,
+    file: UploadFile = File(..., description="音频文件 (支持 wav, mp3, m4a 等格式)"),
+    profile: bool = Query(False, description="处理时开启性能剖析"),
+    priority: Optional[int] = Query(
+        None, ge=0, le=9, description="优先级, 越大越先处理"
+    ),
+    x_client_id: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None),
 ):
     """
     上传音频文件创建转录任务
-    
+
     - **file**: 音频文件
-    
-    返回任务ID，可用于查询结果
+    - **profile**: 对该任务开启 torch profiler 与内存快照, 产物通过 /admin/tasks/{task_id}/profile 下载
+    - **priority**: 0-9, 越大越先处理; 不指定时短音频为交互优先级, 长音频为批处理优先级
+    - **X-Api-Key** 请求头: ADMISSION_API_KEYS 中配置的密钥, 按其对应的客户端公平调度并限制排队量;
+      没有密钥时使用客户端 IP, CLIENT_ID_SOURCE=header 时使用认证代理设置的 X-Client-Id 请求头
+
+    返回任务ID和预计完成时间; 排队已满时返回 429, Retry-After 头给出建议的重试间隔（秒）
     """
+    start_ns = time.time_ns()
+
     # 验证文件类型
     if not file.filename:
         raise HTTPException(status_code=400, detail="无效的文件")
-    
+
     allowed_extensions = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac"}
     file_ext = Path(file.filename).suffix.lower()
     if file_ext not in allowed_extensions:
         raise HTTPException(
             status_code=400,
-            detail=f"不支持的文件格式。支持的格式: {', '.join(allowed_extensions)}"
+            detail=f"不支持的文件格式。支持的格式: {', '.join(allowed_extensions)}",
         )
-    
-    # 生成任务ID
-    task_id = str(uuid.uuid4())
-    
-    # 保存文件
-    file_path = UPLOAD_DIR / f"{task_id}{file_ext}"
+
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
-    
-    # 创建任务记录
-    now = datetime.now().isoformat()
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO tasks 
-               (task_id, filename, file_path, status, created_at, updated_at)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (task_id, file.filename, str(file_path), TaskStatus.PENDING, now, now)
+        client_id = admission.resolve_client_id(
+            x_api_key, x_client_id, request.client.host if request.client else None
         )
-    
-    # 添加后台任务处理
-    background_tasks.add_task(process_audio_task, task_id)
-    
+    except admission.InvalidApiKey as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    # 准入控制: 排队已满时直接拒绝, 不写入文件
+    stats = await db_executor.run(
+        fetch_queue_stats, client_id, admission.ADMISSION_THROUGHPUT_SAMPLE
+    )
+    reject_if_over_capacity(admission.check(stats, client_id))
+
+    # 生成任务ID
+    task_id = str(uuid.uuid4())
+
+    # 上传请求是任务链路的根 span
+    with tracing.task_span(
+        task_id, "upload", root=True, start_ns=start_ns, filename=file.filename
+    ):
+        # 保存文件
+        file_path = UPLOAD_DIR / f"{task_id}{file_ext}"
+        try:
+            with tracing.span("save_upload") as span:
+                size = await asyncio.to_thread(save_upload, file.file, file_path)
+                if span:
+                    span.set_attribute("bytes", size)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+
+        # 加上本任务的音频时长后再检查一次
+        audio_seconds = estimate_audio_seconds(file_path, size)
+        rejection = admission.check(stats, client_id, audio_seconds)
+        if rejection:
+            file_path.unlink(missing_ok=True)
+            reject_if_over_capacity(rejection)
+        metrics.uploads_total.inc()
+        metrics.upload_bytes_total.inc(size)
+
+        if priority is None:
+            priority = derive_priority(audio_seconds)
+
+        # 创建任务记录, 即进入队列
+        now = datetime.now().isoformat()
+        with tracing.span("enqueue"):
+            await db_executor.run(
+                insert_task,
+                task_id,
+                file.filename,
+                str(file_path),
+                TaskStatus.PENDING,
+                now,
+                profile,
+                priority,
+                client_id,
+                audio_seconds,
+            )
+
+        # 唤醒进程内的 worker; api 模式下由独立 worker 轮询领取
+        if inference_worker is not None:
+            inference_worker.task_available.set()
+
+    wait_seconds = admission.estimate_wait(stats, priority, audio_seconds)
     return TaskResponse(
         task_id=task_id,
         status=TaskStatus.PENDING,
-        message="任务已创建，正在处理中"
+        message="任务已创建，正在处理中",
+        priority=priority,
+        estimated_wait_seconds=round(wait_seconds, 1)
+        if wait_seconds is not None
+        else None,
+        estimated_completion_at=(
+            (datetime.now() + timedelta(seconds=wait_seconds)).isoformat()
+            if wait_seconds is not None
+            else None
+        ),
     )
 
 
-@app.get("/api/tasks/{task_id}", response_model=TaskResult)
-async def get_task_result(task_id: str):
+@app.get(
+    "/api/tasks/{task_id}",
+    response_model=TaskResult,
+    response_model_exclude_unset=True,
+)
+async def get_task_result(task_id: str, include: Optional[str] = None):
     """
     查询任务结果
-    
+
     - **task_id**: 任务ID
-    
+    - **include**: 附加字段, 逗号分隔; `metrics` 返回分阶段耗时、生成 token 数和实时率
+
     返回任务状态和转录结果（如果已完成）
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
-        row = cursor.fetchone()
-    
+    row = await db_executor.run(fetch_task, task_id)
+
     if not row:
         raise HTTPException(status_code=404, detail="任务不存在")
-    
+
     result = {
         "task_id": row["task_id"],
         "status": row["status"],
         "filename": row["filename"],
         "created_at": row["created_at"],
         "updated_at": row["updated_at"],
-        "error_message": row["error_message"]
+        "error_message": row["error_message"],
     }
-    
+
     # 如果任务完成，解析结果
     if row["status"] == TaskStatus.COMPLETED and row["result"]:
         speakers_data = json.loads(row["result"])
@@ -444,65 +343,201 @@ async def get_task_result(task_id: str):
                 speaker_id=s["speaker_id"],
                 start=s["start"],
                 end=s["end"],
-                text=s["text"]
+                text=s["text"],
             )
             for s in speakers_data
         ]
     else:
         result["speakers"] = None
-    
+
+    includes = {item.strip() for item in (include or "").split(",")}
+    if "metrics" in includes:
+        result["metrics"] = json.loads(row["metrics"]) if row["metrics"] else None
+
     return TaskResult(**result)
 
 
+@app.delete("/api/tasks/{task_id}")
+async def cancel_audio_task(task_id: str):
+    """
+    取消任务
+
+    - 待处理的任务直接取消
+    - 处理中的任务在当前片段或当前 token 生成后停止, worker 随即处理下一个任务
+
+    取消后上传的音频文件被删除; 已结束的任务返回 409
+    """
+    row = await db_executor.run(cancel_task, task_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if row["status"] not in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+        raise HTTPException(status_code=409, detail=f"任务已结束: {row['status']}")
+
+    if row["status"] == TaskStatus.PENDING:
+        await asyncio.to_thread(Path(row["file_path"]).unlink, missing_ok=True)
+    elif inference_worker is not None:
+        # 嵌入模式下立即通知本进程的 worker; 独立 worker 进程轮询数据库得知取消,
+        # 停止后删除上传文件
+        inference_worker.cancel_running(task_id)
+
+    return {"task_id": task_id, "status": TaskStatus.CANCELLED, "message": "任务已取消"}
+
+
 @app.get("/api/tasks")
 async def list_tasks(
     status: Optional[str] = None,
-    limit: int = 100,
-    offset: int = 0
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    filename_prefix: Optional[str] = None,
 ):
     """
-    列出所有任务
-    
-    - **status**: 过滤状态 (可选: pending, processing, completed, failed)
+    列出所有任务 (按创建时间倒序)
+
+    - **status**: 过滤状态 (可选: pending, processing, completed, failed, cancelled)
     - **limit**: 返回数量限制
-    - **offset**: 偏移量
+    - **cursor**: 上一页返回的 `next_cursor`, 用于翻页
+    - **created_after** / **created_before**: 按创建时间范围过滤 (ISO 8601)
+    - **filename_prefix**: 按文件名前缀过滤
+    - **offset**: 偏移量 (已不推荐, 深分页请使用 cursor)
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        if status:
-            query = """
-                SELECT task_id, filename, status, created_at, updated_at 
-                FROM tasks 
-                WHERE status = ?
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
-            """
-            cursor.execute(query, (status, limit, offset))
-        else:
-            query = """
-                SELECT task_id, filename, status, created_at, updated_at 
-                FROM tasks 
-                ORDER BY created_at DESC
-                LIMIT ? OFFSET ?
-            """
-            cursor.execute(query, (limit, offset))
-        
-        rows = cursor.fetchall()
-        
-        return {
-            "tasks": [
-                {
-                    "task_id": row["task_id"],
-                    "filename": row["filename"],
-                    "status": row["status"],
-                    "created_at": row["created_at"],
-                    "updated_at": row["updated_at"]
-                }
-                for row in rows
-            ],
-            "count": len(rows)
+    try:
+        rows, next_cursor, total_estimate = await db_executor.run(
+            query_tasks,
+            status=status,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            created_after=created_after.isoformat() if created_after else None,
+            created_before=created_before.isoformat() if created_before else None,
+            filename_prefix=filename_prefix,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "tasks": [
+            {
+                "task_id": row["task_id"],
+                "filename": row["filename"],
+                "status": row["status"],
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"],
+            }
+            for row in rows
+        ],
+        "count": len(rows),
+        "next_cursor": next_cursor,
+        "total_estimate": total_estimate,
+    }
+
+
+LOOPBACK_HOSTS = {"127.0.0.1", "::1"}
+
+
+def check_admin_token(request: Request, token: Optional[str]):
+    """管理端点的访问校验: 未配置 ADMIN_TOKEN 时只允许本机访问"""
+    if not ADMIN_TOKEN:
+        host = request.client.host if request.client else None
+        if host not in LOOPBACK_HOSTS:
+            raise HTTPException(
+                status_code=403, detail="未配置 ADMIN_TOKEN, 管理端点只允许本机访问"
+            )
+        return
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="无效的管理令牌")
+
+
+async def fetch_profile_dir(task_id: str) -> Path:
+    row = await db_executor.run(fetch_task, task_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return artifact_dir(Path(row["file_path"]))
+
+
+@app.get("/admin/tasks/{task_id}/profile")
+async def list_profile_artifacts(
+    request: Request,
+    task_id: str,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    列出任务的性能剖析产物
+
+    任务上传时指定 profile=true 或被 PROFILE_SAMPLE_RATE 抽中时才会生成
+    """
+    check_admin_token(request, x_admin_token)
+    directory = await fetch_profile_dir(task_id)
+    artifacts = await asyncio.to_thread(list_artifacts, directory)
+    return {
+        "task_id": task_id,
+        "artifacts": [
+            {**artifact, "url": f"/admin/tasks/{task_id}/profile/{artifact['name']}"}
+            for artifact in artifacts
+        ],
+    }
+
+
+@app.get("/admin/tasks/{task_id}/profile/{name}")
+async def download_profile_artifact(
+    request: Request,
+    task_id: str,
+    name: str,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """下载任务的一个性能剖析产物"""
+    check_admin_token(request, x_admin_token)
+    if name not in ARTIFACTS:
+        raise HTTPException(status_code=404, detail="剖析产物不存在")
+    path = (await fetch_profile_dir(task_id)) / name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="剖析产物不存在")
+    return FileResponse(path, filename=f"{task_id}-{name}")
+
+
+@app.get("/ready")
+async def readiness():
+    """
+    就绪检查, 供负载均衡器使用
+
+    - embedded 模式: 本进程的模型已加载并预热时返回 200
+    - api 模式: 至少有一个在线 worker 就绪时返回 200
+
+    未就绪时返回 503, 响应中包含各模型的加载状态和耗时
+    """
+    if inference_worker is not None:
+        status = inference_worker.readiness()
+        content = {"mode": SERVICE_MODE, **status}
+    else:
+        workers = await db_executor.run(fetch_live_workers, WORKER_HEARTBEAT_TIMEOUT)
+        content = {
+            "mode": SERVICE_MODE,
+            "ready": any(w["ready"] for w in workers),
+            "workers": workers,
         }
+    return JSONResponse(status_code=200 if content["ready"] else 503, content=content)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus 格式的运行指标
+
+    包括按状态的任务数（排队深度）、上传量和数据库查询耗时; 嵌入模式下还包括
+    任务与各阶段耗时、片段数、生成 token 数、处理的音频时长和模型加载耗时
+    """
+    counts = await db_executor.run(fetch_task_counts)
+    for status in (
+        TaskStatus.PENDING,
+        TaskStatus.PROCESSING,
+        TaskStatus.COMPLETED,
+        TaskStatus.FAILED,
+        TaskStatus.CANCELLED,
+    ):
+        metrics.tasks_by_status.set(counts.get(status, 0), status=status)
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/")
@@ -511,22 +546,20 @@ async def root():
     return {
         "service": "语音识别服务",
         "status": "running",
-        "device": DEVICE,
+        "mode": SERVICE_MODE,
+        "device": inference_worker.DEVICE if inference_worker else os.getenv("DEVICE"),
         "endpoints": {
             "upload": "/api/tasks/upload",
             "get_result": "/api/tasks/{task_id}",
-            "list_tasks": "/api/tasks"
-        }
+            "list_tasks": "/api/tasks",
+            "ready": "/ready",
+            "metrics": "/metrics",
+        },
     }
 
 
 if __name__ == "__main__":
     import uvicorn
-    
+
     # 运行服务
-    uvicorn.run(
-        app,
-        host=SERVICE_HOST,
-        port=SERVICE_PORT,
-        log_level="info"
-    )
+    uvicorn.run(app, host=SERVICE_HOST, port=SERVICE_PORT, log_level="info")
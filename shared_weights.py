@@ -0,0 +1,123 @@
+"""
+多进程共享 ASR 模型权重 (CPU)
+
+首次使用时把模型权重按目标精度导出为一个 torch 权重文件 (默认放在 /dev/shm),
+之后每个 worker 进程用 mmap 只读映射该文件, 直接把映射出的张量作为模型参数。
+所有进程共享同一份物理页, 每个 worker 的常驻内存只剩下激活值,
+启动时也不再需要反序列化和转换权重。
+
+预先生成缓存 (可选, 否则由第一个 worker 生成):
+
+    python shared_weights.py --checkpoint_dir /path/to/GLM-ASR-Nano-2512
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM
+
+from inference import PRECISIONS, precision_dtype
+from model_cache import cache_name, locked_export
+
+
+def default_cache_dir() -> Path:
+    """优先使用 tmpfs 共享内存目录"""
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / "glm-asr-weights"
+    return Path("./weights_cache")
+
+
+WEIGHTS_CACHE_DIR = Path(os.getenv("WEIGHTS_CACHE_DIR", default_cache_dir()))
+
+
+def cache_path(checkpoint_dir: Path, dtype: torch.dtype, cache_dir: Path) -> Path:
+    """权重缓存文件路径, 按模型目录、目录内容指纹和精度区分"""
+    name = cache_name(checkpoint_dir)
+    return Path(cache_dir) / f"{name}-{str(dtype).replace('torch.', '')}.pt"
+
+
+def export_weights(
+    checkpoint_dir: Path,
+    dtype: torch.dtype = torch.bfloat16,
+    cache_dir: Path = WEIGHTS_CACHE_DIR,
+) -> Path:
+    """
+    将模型权重导出为可 mmap 的缓存文件, 已存在时直接返回
+    多个进程同时调用时通过文件锁保证只导出一次
+    """
+    path = cache_path(checkpoint_dir, dtype, cache_dir)
+
+    def export(tmp_path: Path):
+        print(f"Exporting shared weights to {path}...")
+        config = AutoConfig.from_pretrained(checkpoint_dir, trust_remote_code=True)
+        model = AutoModelForCausalLM.from_pretrained(
+            checkpoint_dir,
+            config=config,
+            torch_dtype=dtype,
+            trust_remote_code=True,
+        )
+        torch.save(model.state_dict(), tmp_path)
+
+    return locked_export(path, export)
+
+
+def load_shared_model(
+    checkpoint_dir: Path,
+    dtype: torch.dtype = torch.bfloat16,
+    cache_dir: Path = WEIGHTS_CACHE_DIR,
+):
+    """
+    从共享权重缓存构建模型: 参数直接引用 mmap 映射的只读页, 不复制
+    仅适用于 CPU 推理
+    """
+    try:
+        from accelerate import init_empty_weights
+    except ImportError:
+        raise ImportError("共享权重模式需要安装 accelerate: pip install accelerate")
+
+    path = export_weights(checkpoint_dir, dtype, cache_dir)
+
+    config = AutoConfig.from_pretrained(checkpoint_dir, trust_remote_code=True)
+    # 参数建在 meta 设备上不分配内存; buffer (如 rotary 频率表) 不在 state_dict 中, 照常创建
+    with init_empty_weights(include_buffers=False):
+        model = AutoModelForCausalLM.from_config(
+            config, torch_dtype=dtype, trust_remote_code=True
+        )
+
+    state_dict = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    model.tie_weights()
+    # 共享页只读, 推理时也不需要梯度
+    model.requires_grad_(False)
+    model.eval()
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出多进程共享的 ASR 权重缓存")
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=os.getenv("CHECKPOINT_DIR", str(Path(__file__).parent)),
+    )
+    parser.add_argument("--cache_dir", type=str, default=str(WEIGHTS_CACHE_DIR))
+    parser.add_argument(
+        "--precision",
+        type=str,
+        choices=PRECISIONS,
+        default=os.getenv("ASR_PRECISION", "bf16"),
+        help="与 worker 的 ASR_PRECISION 一致; int8 在 fp32 权重上量化",
+    )
+    args = parser.parse_args()
+
+    path = export_weights(
+        Path(args.checkpoint_dir), precision_dtype(args.precision), Path(args.cache_dir)
+    )
+    print(f"Shared weights ready: {path} ({path.stat().st_size / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
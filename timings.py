@@ -0,0 +1,85 @@
+"""
+分阶段计时
+
+处理一个任务时创建 StageTimer 并用 activate() 设为当前线程的计时器,
+调用链中任意位置的 stage(name) 都会把耗时累加到该计时器上; 没有激活计时器时
+stage() 不做任何事, 因此推理代码可以无条件埋点。
+
+    timer = StageTimer()
+    with activate(timer):
+        with stage("decode"):
+            ...
+    timer.as_dict()  # {"decode": 0.012, ...}
+
+count(name, value) 以同样的方式累加计数, 如生成的 token 数。
+stage() 同时在当前任务链路中打开同名 span (见 tracing.py)。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import tracing
+
+_local = threading.local()
+
+
+class StageTimer:
+    """按阶段名累计耗时（秒）和计数"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 4) for name, seconds in self.stages.items()}
+
+
+def current() -> Optional[StageTimer]:
+    """当前线程激活的计时器"""
+    return getattr(_local, "timer", None)
+
+
+@contextmanager
+def activate(timer: StageTimer):
+    """在当前线程中激活计时器, 支持嵌套"""
+    previous = current()
+    _local.timer = timer
+    try:
+        yield timer
+    finally:
+        _local.timer = previous
+
+
+@contextmanager
+def stage(name: str):
+    """将耗时计入当前线程的计时器, 没有激活的计时器时不计时"""
+    timer = current()
+    with tracing.span(name):
+        if timer is None:
+            yield
+            return
+        with timer.stage(name):
+            yield
+
+
+def count(name: str, value: int = 1):
+    """计入当前线程的计时器, 没有激活的计时器时忽略"""
+    timer = current()
+    if timer is not None:
+        timer.count(name, value)
@@ -0,0 +1,266 @@
+"""
+轻量的请求链路追踪
+
+按任务记录 span: 上传 (upload → save_upload → insert_task)、排队 (queue)、
+处理 (process_audio_task → decode / diarize / transcribe_segment → features / generate → db)。
+timings.stage() 同时打开同名 span, 因此已有的分阶段计时点都会出现在链路中。
+
+同一任务的 span 使用由 task_id 得到的 trace id (uuid 的 32 位十六进制即 16 字节),
+API 进程与 worker 进程无需传递上下文即可关联到同一条链路; 抽样同样由 trace id
+决定, 各进程对同一任务的抽样结果一致。
+
+导出格式为 OTLP/JSON (ExportTraceServiceRequest), 每个任务一行, 可由
+OpenTelemetry Collector 的 otlpjsonfile receiver 读取后转发到 Jaeger / Tempo:
+
+    TRACE_EXPORTER=file TRACE_FILE=./traces.jsonl TRACE_SAMPLE_RATE=0.1 python service.py
+
+TRACE_EXPORTER=off (默认) 时 span() 不做任何事。
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# off / file / stdout
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "off")
+TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+# 按 trace id 抽样的比例
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "glm-asr")
+
+# OTLP 的 span kind 与 status code
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        span_id: str,
+        parent_id: Optional[str],
+        start_ns: int,
+        attributes: Dict,
+        kind: int = SPAN_KIND_INTERNAL,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.kind = kind
+        self.error: Optional[str] = None
+        # 本进程内该任务的根 span, 以及已结束的 span, 由根 span 统一导出
+        self.root: "Span" = self
+        self.finished: List["Span"] = []
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": otlp_attributes(self.attributes),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+def otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [
+        {"key": key, "value": otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+class Exporter:
+    """把一个任务的 span 作为一行 OTLP/JSON 写入文件或标准输出"""
+
+    def __init__(self, target: str, path: str):
+        self.target = target
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]):
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": otlp_attributes(
+                            {
+                                "service.name": TRACE_SERVICE_NAME,
+                                "process.pid": os.getpid(),
+                            }
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "glm-asr"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        line = json.dumps(request, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self.target == "stdout":
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                else:
+                    # 多个进程可以追加写同一个文件, 每行一次 write
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(line)
+        except Exception as e:
+            print(f"Failed to export trace: {str(e)}")
+
+
+exporter = Exporter(TRACE_EXPORTER, TRACE_FILE) if TRACE_EXPORTER != "off" else None
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def trace_id_for(task_id: str) -> str:
+    """任务的 trace id: task_id (uuid) 的 32 位十六进制"""
+    return task_id.replace("-", "").lower()
+
+
+def root_span_id(trace_id: str) -> str:
+    """上传请求的 span id, 由 trace id 确定, 其他进程的 span 以它为父 span"""
+    return trace_id[:16]
+
+
+def sampled(trace_id: str) -> bool:
+    """
+    按 trace id 确定性抽样
+    trace id 来自 uuid4, 其中的版本位和变体位不是随机的, 因此先取哈希再与比例比较
+    """
+    if TRACE_SAMPLE_RATE >= 1:
+        return True
+    digest = hashlib.sha256(trace_id.encode("ascii")).hexdigest()
+    return int(digest[:16], 16) < TRACE_SAMPLE_RATE * 2**64
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def _activate(span: Span, export: bool):
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        span.end_ns = time.time_ns()
+        root = span if export else span.root
+        root.finished.append(span)
+        if export:
+            exporter.export(root.finished)
+
+
+@contextmanager
+def task_span(
+    task_id: str,
+    name: str,
+    root: bool = False,
+    start_ns: Optional[int] = None,
+    **attributes,
+):
+    """
+    任务在本进程内的根 span, 结束时导出本进程记录的该任务的全部 span
+    root=True 表示整条链路的根 (上传请求), 否则以上传请求的 span 为父 span
+    """
+    trace_id = trace_id_for(task_id)
+    if exporter is None or not sampled(trace_id):
+        yield None
+        return
+    span = Span(
+        name,
+        trace_id,
+        root_span_id(trace_id) if root else secrets.token_hex(8),
+        None if root else root_span_id(trace_id),
+        start_ns or time.time_ns(),
+        {"task_id": task_id, **attributes},
+        SPAN_KIND_SERVER if root else SPAN_KIND_INTERNAL,
+    )
+    with _activate(span, export=True):
+        yield span
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """当前 span 的子 span, 没有活动的任务链路时不做任何事"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(
+        name,
+        parent.trace_id,
+        secrets.token_hex(8),
+        parent.span_id,
+        time.time_ns(),
+        attributes,
+    )
+    child.root = parent.root
+    with _activate(child, export=False):
+        yield child
+
+
+def record_span(
+    name: str,
+    start_ns: int,
+    end_ns: int,
+    parent_id: Optional[str] = None,
+    **attributes,
+):
+    """
+    记录一个已知起止时间的 span, 如任务在队列中的等待
+    parent_id 默认为当前 span
+    """
+    parent = _current.get()
+    if parent is None:
+        return
+    child = Span(
+        name,
+        parent.trace_id,
+        secrets.token_hex(8),
+        parent_id or parent.span_id,
+        start_ns,
+        attributes,
+    )
+    child.end_ns = end_ns
+    parent.root.finished.append(child)
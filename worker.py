@@ -0,0 +1,1606 @@
+"""
+推理 Worker - 说话人分离与语音识别
+从任务数据库领取待处理任务并执行推理, 可作为独立进程运行:
+
+    python worker.py
+
+也可由 service.py 在嵌入模式下以线程方式启动
+"""
+
+import argparse
+import contextvars
+import gc
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 加载环境变量
+try:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+except ImportError:
+    pass  # python-dotenv 是可选的
+
+import torch
+import torchaudio
+from transformers import (
+    AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    WhisperFeatureExtractor,
+)
+
+import cancellation
+import metrics
+import tracing
+from backends import InferenceBackend, StubBackend
+from cancellation import TaskCancelled
+from db import TaskStatus, get_db, init_db, record_worker_heartbeat
+from inference import (
+    WHISPER_FEAT_CFG,
+    build_prompt_from_wav,
+    load_model,
+    precision_dtype,
+    prepare_inputs,
+    quantize_dynamic_int8,
+)
+from profiling import artifact_dir, profile_task, section, should_profile
+from timings import StageTimer, activate, count, stage
+from timings import current as current_timer
+
+
+# 配置
+def parse_budget(value: str) -> Tuple[float, float]:
+    """
+    解析时间预算 "固定秒数,每秒音频对应的秒数"
+    如 "600,10" 表示 600 秒加上音频时长的 10 倍; "0,0" 表示不限制
+    """
+    base, _, per_audio_second = value.partition(",")
+    return float(base or 0), float(per_audio_second or 0)
+
+
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR", Path(__file__).parent))
+DEVICE = os.getenv("DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+# 推理后端: model (默认, pyannote + GLM-ASR) / stub (不加载模型, 用于压测排队和 I/O 开销)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "model")
+# ASR 推理精度: bf16 (默认) / fp32 / int8 (线性层动态量化, 仅 CPU)
+ASR_PRECISION = os.getenv("ASR_PRECISION", "bf16")
+# ASR 权重加载方式: default 每个进程各自加载; shared 多进程 mmap 共享同一份权重 (仅 CPU)
+ASR_WEIGHTS_MODE = os.getenv("ASR_WEIGHTS_MODE", "default")
+# 音频编码器后端: torch (默认) / onnx (导出为 ONNX 后用 ONNX Runtime 执行, 仅 CPU)
+ASR_ENCODER_BACKEND = os.getenv("ASR_ENCODER_BACKEND", "torch")
+# torch.compile 编译加速: off (默认) / encoder / decoder / all, 编译失败时自动回退 eager
+ASR_COMPILE = os.getenv("ASR_COMPILE", "off")
+# 音频编码器按音频块数分桶编译, 超过最大桶的输入走 eager
+ASR_COMPILE_BUCKETS = [
+    int(b) for b in os.getenv("ASR_COMPILE_BUCKETS", "1,2,4,8").split(",") if b.strip()
+]
+# 没有待处理任务时的轮询间隔（秒）
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+# 启动时预加载的模型, 逗号分隔: asr,diarization; 为空则首个任务时按需加载
+PRELOAD_MODELS = [
+    m.strip() for m in os.getenv("PRELOAD_MODELS", "").split(",") if m.strip()
+]
+# 预热推理使用的合成音频时长（秒）, 为空则跳过预热
+WARMUP_SECONDS = [
+    float(s) for s in os.getenv("WARMUP_SECONDS", "5,30").split(",") if s.strip()
+]
+# 模型空闲多久（秒）后卸载, 0 表示常驻
+MODEL_IDLE_TIMEOUTS = {
+    "asr": float(os.getenv("ASR_IDLE_TIMEOUT", "0")),
+    "diarization": float(os.getenv("DIARIZATION_IDLE_TIMEOUT", "0")),
+}
+# 模型内存预算（MB）, 加载新模型超出预算时卸载最久未使用的空闲模型, 0 表示不限制
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+# worker 进程向数据库上报状态的间隔（秒）
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "5"))
+# 独立运行时暴露 Prometheus 指标的端口, 0 表示不暴露; 进程池中第 i 个进程使用端口 + i
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# 同优先级的任务优先分给该时间窗口（秒）内已处理音频时长最少的客户端
+SCHEDULER_FAIR_WINDOW = float(os.getenv("SCHEDULER_FAIR_WINDOW", "600"))
+# 更高优先级的任务等待超过该时间（秒）时, 正在处理的任务在片段之间保存进度并重新排队;
+# 0 表示不抢占
+SCHEDULER_PREEMPT_AFTER = float(os.getenv("SCHEDULER_PREEMPT_AFTER", "0"))
+# 检查正在处理的任务是否已被取消的间隔（秒）
+WORKER_CANCEL_POLL_INTERVAL = float(os.getenv("WORKER_CANCEL_POLL_INTERVAL", "1.0"))
+# 在生成当前片段的同时提前准备输入（切片、特征提取、分词）的片段数, 0 表示不预取
+SEGMENT_PREFETCH_DEPTH = int(os.getenv("SEGMENT_PREFETCH_DEPTH", "2"))
+# 按音频时长计算的时间预算, 格式见 parse_budget: 整个任务、说话人分离、每个片段的转录
+TASK_TIMEOUT = parse_budget(os.getenv("TASK_TIMEOUT", "600,10"))
+DIARIZE_TIMEOUT = parse_budget(os.getenv("DIARIZE_TIMEOUT", "300,2"))
+SEGMENT_TIMEOUT = parse_budget(os.getenv("SEGMENT_TIMEOUT", "120,10"))
+# 看门狗检查时间预算的间隔（秒）
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "1.0"))
+# 超时的任务在该时间（秒）内仍未停止时, 视为卡在不可中断的推理中, 回收 worker
+WATCHDOG_GRACE_SECONDS = float(os.getenv("WATCHDOG_GRACE_SECONDS", "60"))
+# 独立运行的 worker 进程因推理卡住而退出时的退出码, 由进程池或外部守护进程重启
+WATCHDOG_EXIT_CODE = 75
+
+# 确保上传目录存在
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# 有新任务入队时由 API 设置, 唤醒同进程内等待的 worker 线程
+task_available = threading.Event()
+# 预加载完成（或未启用预加载）后设置, worker 线程在此之前不领取任务
+preload_done = threading.Event()
+# 本进程中正在处理的任务
+running_tasks: Dict[str, "RunningTask"] = {}
+running_tasks_lock = threading.Lock()
+# 推理卡住后被替换的 worker 线程, 卡住的任务结束后线程直接退出
+retired_threads = set()
+
+
+# ==================== 全局模型加载 ====================
+
+
+def estimate_memory_bytes(obj, depth: int = 3) -> int:
+    """
+    估算模型占用的内存: 汇总 obj 及其属性中所有 nn.Module 的参数和 buffer
+    pyannote Pipeline 不是 nn.Module, 其子模型挂在属性上, 因此需要向下查找
+    """
+    modules = []
+    seen = set()
+
+    def collect(value, level):
+        if id(value) in seen:
+            return
+        seen.add(id(value))
+        if isinstance(value, torch.nn.Module):
+            modules.append(value)
+        elif level > 0 and hasattr(value, "__dict__"):
+            for attr in vars(value).values():
+                collect(attr, level - 1)
+
+    collect(obj, depth)
+
+    total = 0
+    tensors = set()
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            if tensor.data_ptr() not in tensors:
+                tensors.add(tensor.data_ptr())
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelManager:
+    """模型管理器 - 单例模式"""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.tokenizer = None
+        self.feature_extractor = None
+        self.asr_model = None
+        self.diarization_pipeline = None
+        # 各模型的加载状态: unloaded / loading / warming_up / ready / evicted / failed
+        self.model_status = {
+            name: {
+                "state": "unloaded",
+                "load_seconds": None,
+                "warmup_seconds": None,
+                "error": None,
+                "memory_mb": None,
+                "evictions": {"idle": 0, "memory": 0},
+                "reloads": 0,
+                "last_reload_seconds": None,
+            }
+            for name in ("asr", "diarization")
+        }
+        self._locks = {name: threading.Lock() for name in self.model_status}
+        # 使用计数与最近使用时间, 由 _usage_lock 保护; 正在使用的模型不会被卸载
+        self._usage_lock = threading.Lock()
+        self._in_use = {name: 0 for name in self.model_status}
+        self._last_used = {name: 0.0 for name in self.model_status}
+        self._memory_bytes = {name: 0 for name in self.model_status}
+        self._initialized = True
+
+    def set_status(self, name: str, state: str, **fields):
+        """更新模型加载状态"""
+        self.model_status[name].update(state=state, **fields)
+
+    def status(self) -> Dict[str, Dict]:
+        """返回各模型加载状态的快照"""
+        now = time.monotonic()
+        snapshot = {}
+        for name, status in self.model_status.items():
+            snapshot[name] = {
+                **status,
+                "evictions": dict(status["evictions"]),
+                "in_use": self._in_use[name],
+                "idle_seconds": (
+                    now - self._last_used[name] if self.is_loaded(name) else None
+                ),
+            }
+        return snapshot
+
+    def is_loaded(self, name: str) -> bool:
+        """模型是否已在内存中"""
+        if name == "asr":
+            return self.asr_model is not None
+        return self.diarization_pipeline is not None
+
+    @contextmanager
+    def use(self, name: str):
+        """
+        使用模型的上下文: 按需加载（被卸载过则重新加载）, 使用期间不会被卸载
+        """
+        with self._usage_lock:
+            self._in_use[name] += 1
+        try:
+            if not self.is_loaded(name):
+                was_evicted = self.model_status[name]["state"] == "evicted"
+                start = time.perf_counter()
+                if name == "asr":
+                    self.load_asr_model()
+                else:
+                    self.load_diarization_pipeline()
+                if was_evicted:
+                    status = self.model_status[name]
+                    status["reloads"] += 1
+                    status["last_reload_seconds"] = time.perf_counter() - start
+            yield
+        finally:
+            with self._usage_lock:
+                self._in_use[name] -= 1
+                self._last_used[name] = time.monotonic()
+
+    def _loaded(self, name: str, start: float, model):
+        """模型加载完成后记录状态, 并按内存预算卸载其他模型"""
+        self._memory_bytes[name] = estimate_memory_bytes(model)
+        with self._usage_lock:
+            self._last_used[name] = time.monotonic()
+        load_seconds = time.perf_counter() - start
+        metrics.model_load_seconds.observe(load_seconds, model=name)
+        self.set_status(
+            name,
+            "ready",
+            load_seconds=load_seconds,
+            memory_mb=round(self._memory_bytes[name] / 2**20, 1),
+        )
+        self.enforce_memory_budget(keep=name)
+
+    def evict(self, name: str, reason: str) -> bool:
+        """
+        卸载模型, 释放内存; 模型正在使用或正在加载时跳过
+        返回: 是否卸载
+        """
+        with self._usage_lock:
+            if self._in_use[name] > 0 or not self.is_loaded(name):
+                return False
+            # 不阻塞等待加载锁, 避免与加载线程互相等待
+            if not self._locks[name].acquire(blocking=False):
+                return False
+            try:
+                if name == "asr":
+                    self.asr_model = None
+                else:
+                    self.diarization_pipeline = None
+                self.model_status[name]["evictions"][reason] += 1
+                self.set_status(name, "evicted")
+            finally:
+                self._locks[name].release()
+
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        print(f"Evicted {name} model ({reason})")
+        return True
+
+    def enforce_memory_budget(self, keep: Optional[str] = None):
+        """超出内存预算时, 按最近使用时间从旧到新卸载空闲模型"""
+        if MODEL_MEMORY_BUDGET_MB <= 0:
+            return
+        budget = MODEL_MEMORY_BUDGET_MB * 2**20
+        candidates = sorted(
+            (
+                name
+                for name in self.model_status
+                if name != keep and self.is_loaded(name)
+            ),
+            key=lambda name: self._last_used[name],
+        )
+        for name in candidates:
+            # keep 的大小按上次加载时记录的值计入, 首次加载时为 0
+            used = self._memory_bytes[keep] if keep else 0
+            used += sum(
+                self._memory_bytes[n]
+                for n in self.model_status
+                if n != keep and self.is_loaded(n)
+            )
+            if used <= budget:
+                break
+            self.evict(name, "memory")
+
+    def evict_idle(self):
+        """卸载空闲时间超过配置的模型"""
+        now = time.monotonic()
+        for name, timeout in MODEL_IDLE_TIMEOUTS.items():
+            if (
+                timeout > 0
+                and self.is_loaded(name)
+                and now - self._last_used[name] > timeout
+            ):
+                self.evict(name, "idle")
+
+    def load_asr_model(self):
+        """加载ASR模型"""
+        if self.asr_model is not None:
+            return
+
+        with self._locks["asr"]:
+            if self.asr_model is not None:
+                return
+
+            print("Loading ASR model...")
+            self.set_status("asr", "loading", error=None)
+            # 先按预算腾出上次加载时记录的内存
+            self.enforce_memory_budget(keep="asr")
+            start = time.perf_counter()
+            try:
+                self.tokenizer = AutoTokenizer.from_pretrained(CHECKPOINT_DIR)
+                self.feature_extractor = WhisperFeatureExtractor(**WHISPER_FEAT_CFG)
+
+                if ASR_WEIGHTS_MODE == "shared" and DEVICE == "cpu":
+                    from shared_weights import load_shared_model
+
+                    asr_model = load_shared_model(
+                        CHECKPOINT_DIR, precision_dtype(ASR_PRECISION)
+                    )
+                    if ASR_PRECISION == "int8":
+                        # 量化后的线性层权重为各进程私有, 只有其余权重仍然共享
+                        asr_model = quantize_dynamic_int8(asr_model)
+                else:
+                    if ASR_WEIGHTS_MODE == "shared":
+                        print(
+                            f"Shared weights are CPU-only, loading normally on {DEVICE}"
+                        )
+                    asr_model = load_model(CHECKPOINT_DIR, DEVICE, ASR_PRECISION)
+
+                if ASR_ENCODER_BACKEND == "onnx":
+                    if DEVICE == "cpu":
+                        from onnx_encoder import enable_onnx_encoder
+
+                        asr_model = enable_onnx_encoder(asr_model, CHECKPOINT_DIR)
+                    else:
+                        print(
+                            f"ONNX encoder is CPU-only, using PyTorch encoder on {DEVICE}"
+                        )
+
+                if ASR_COMPILE != "off":
+                    from acceleration import enable_compile
+
+                    targets = (
+                        ["encoder", "decoder"]
+                        if ASR_COMPILE == "all"
+                        else [ASR_COMPILE]
+                    )
+                    if ASR_ENCODER_BACKEND == "onnx" and DEVICE == "cpu":
+                        # 编码器已由 ONNX Runtime 执行
+                        targets = [t for t in targets if t != "encoder"]
+                    asr_model = enable_compile(asr_model, targets, ASR_COMPILE_BUCKETS)
+            except Exception as e:
+                self.set_status("asr", "failed", error=str(e))
+                raise
+
+            self.asr_model = asr_model
+            self._loaded("asr", start, asr_model)
+            print("ASR model loaded successfully")
+
+    def load_diarization_pipeline(self, auth_token: Optional[str] = None):
+        """加载说话人分离模型"""
+        if self.diarization_pipeline is not None:
+            return
+
+        with self._locks["diarization"]:
+            if self.diarization_pipeline is not None:
+                return
+
+            print("Loading diarization pipeline...")
+            self.set_status("diarization", "loading", error=None)
+            self.enforce_memory_budget(keep="diarization")
+            start = time.perf_counter()
+            try:
+                # 需要 Hugging Face token 来访问 pyannote 模型
+                # 可以从环境变量获取: export HUGGINGFACE_TOKEN=your_token
+                token = (
+                    auth_token
+                    or os.getenv("HUGGINGFACE_TOKEN")
+                    or os.getenv("HF_TOKEN")
+                )
+                if not token:
+                    raise ValueError(
+                        "需要 Hugging Face token 来访问 pyannote 模型。"
+                        "请设置环境变量 HUGGINGFACE_TOKEN 或 HF_TOKEN。"
+                        "获取token: https://huggingface.co/settings/tokens"
+                    )
+
+                from pyannote.audio import Pipeline
+
+                pipeline = Pipeline.from_pretrained(
+                    "pyannote/speaker-diarization-3.1", token=token
+                )
+
+                if torch.cuda.is_available():
+                    pipeline.to(torch.device(DEVICE))
+            except Exception as e:
+                self.set_status("diarization", "failed", error=str(e))
+                raise
+
+            self.diarization_pipeline = pipeline
+            self._loaded("diarization", start, pipeline)
+            print("Diarization pipeline loaded successfully")
+
+
+model_manager = ModelManager()
+
+
+# ==================== 核心处理函数 ====================
+
+
+def diarize_audio(waveform: torch.Tensor, sr: int) -> List[Dict]:
+    """
+    使用 pyannote-audio 进行说话人分离
+    返回: [{"speaker": "SPEAKER_00", "start": 0.0, "end": 5.0}, ...]
+    """
+    with model_manager.use("diarization"):
+        # 流水线每处理完一个批次调用 hook, 任务被取消或超时时在此处停止
+        diarization = model_manager.diarization_pipeline(
+            {"waveform": waveform, "sample_rate": sr},
+            hook=cancellation.hook,
+        )
+
+    segments = []
+    for turn, _, speaker in diarization.itertracks(yield_label=True):
+        segments.append({"speaker": speaker, "start": turn.start, "end": turn.end})
+
+    return segments
+
+
+def load_audio(audio_path: Path):
+    """加载音频, 转为 16kHz 单声道"""
+    wav, sr = torchaudio.load(str(audio_path))
+    wav = wav[:1, :]  # 转单声道
+
+    # 转换为正确的采样率
+    if sr != 16000:
+        wav = torchaudio.transforms.Resample(sr, 16000)(wav)
+        sr = 16000
+
+    return wav, sr
+
+
+def extract_audio_segment(
+    waveform: torch.Tensor, sr: int, start: float, end: float
+) -> torch.Tensor:
+    """从已加载的音频中提取片段"""
+    start_sample = int(start * sr)
+    end_sample = int(end * sr)
+    return waveform[:, start_sample:end_sample]
+
+
+class CancelledCriteria(StoppingCriteria):
+    """任务被取消时在下一个 token 处停止生成"""
+
+    def __call__(
+        self, input_ids: torch.LongTensor, scores, **kwargs
+    ) -> torch.BoolTensor:
+        return torch.full(
+            (input_ids.shape[0],),
+            cancellation.cancelled(),
+            dtype=torch.bool,
+            device=input_ids.device,
+        )
+
+
+def prepare_segment(audio_segment: torch.Tensor, sr: int) -> Dict:
+    """片段的模型输入 (mel 特征与提示 token), 只使用 CPU, 可在预取线程中提前执行"""
+    with model_manager.use("asr"), stage("features"):
+        return build_prompt_from_wav(
+            audio_segment,
+            model_manager.tokenizer,
+            model_manager.feature_extractor,
+            merge_factor=model_manager.asr_model.config.merge_factor,
+            chunk_seconds=WHISPER_FEAT_CFG["chunk_length"],
+        )
+
+
+def generate_segment(batch: Dict) -> str:
+    """由 prepare_segment 准备好的输入生成转录文本"""
+    with model_manager.use("asr"):
+        model_inputs, prompt_len = prepare_inputs(
+            batch, DEVICE, precision_dtype(ASR_PRECISION)
+        )
+
+        with stage("generate"), torch.inference_mode():
+            generated = model_manager.asr_model.generate(
+                **model_inputs,
+                max_new_tokens=256,
+                do_sample=False,
+                stopping_criteria=StoppingCriteriaList([CancelledCriteria()]),
+            )
+        # 生成因任务取消而提前停止
+        cancellation.check()
+
+        transcript_ids = generated[0, prompt_len:].cpu().tolist()
+        count("tokens", len(transcript_ids))
+        transcript = model_manager.tokenizer.decode(
+            transcript_ids, skip_special_tokens=True
+        ).strip()
+
+        return transcript or "[Empty]"
+
+
+def transcribe_segment(audio_segment: torch.Tensor, sr: int) -> str:
+    """转录音频片段"""
+    return generate_segment(prepare_segment(audio_segment, sr))
+
+
+class Prefetcher:
+    """
+    在后台线程中按顺序对 items 调用 fn, 最多提前准备 depth 个结果, 占用的内存因此有上限;
+    迭代得到与 items 一一对应的结果, fn 抛出的异常在取到对应结果时重新抛出。
+    depth 为 0 时在迭代时同步调用 fn。
+
+    计时器和取消标志是线程局部的, 后台线程使用自己的计时器, 与消费方的阶段互不重叠:
+    close() 时把后台线程的总耗时计入创建者计时器的 "prefetch" 阶段, 消费方等待结果的
+    时间计入 "prefetch_wait" 阶段。后台线程激活创建者的取消标志, 并通过
+    contextvars.copy_context() 继承链路追踪上下文。
+    """
+
+    def __init__(self, fn: Callable, items, depth: int):
+        self.fn = fn
+        self.items = list(items)
+        self.depth = depth
+        self.timer = StageTimer()
+        self._owner = current_timer()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(depth, 1))
+        self._stop = threading.Event()
+        self._thread = None
+        if depth > 0 and self.items:
+            context = contextvars.copy_context()
+            self._thread = threading.Thread(
+                target=context.run,
+                args=(self._run, cancellation.current()),
+                name="prefetch",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self, event: Optional[threading.Event]):
+        with (
+            activate(self.timer),
+            cancellation.activate(event) if event is not None else nullcontext(),
+        ):
+            for item in self.items:
+                try:
+                    result = (True, self.fn(item))
+                except Exception as e:
+                    result = (False, e)
+                # 消费方已停止时不再等待队列空位
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(result, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set() or not result[0]:
+                    return
+
+    def __iter__(self):
+        for item in self.items:
+            if self._thread is None:
+                yield self.fn(item)
+                continue
+            with stage("prefetch_wait"):
+                ok, value = self._queue.get()
+            if not ok:
+                raise value
+            yield value
+
+    def close(self):
+        self._stop.set()
+        if self._thread is None:
+            return
+        self._thread.join()
+        self._thread = None
+        if self._owner is not None:
+            self._owner.add("prefetch", sum(self.timer.stages.values()))
+            for name, value in self.timer.counters.items():
+                self._owner.count(name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ModelBackend(InferenceBackend):
+    """使用 pyannote 和 GLM-ASR 模型的推理后端, 模型由 model_manager 管理"""
+
+    name = "model"
+
+    def load(self, name: str):
+        if name == "asr":
+            model_manager.load_asr_model()
+        elif name == "diarization":
+            model_manager.load_diarization_pipeline()
+        else:
+            raise ValueError(f"未知的模型: {name}")
+
+    def status(self) -> Dict[str, Dict]:
+        return model_manager.status()
+
+    def set_status(self, name: str, state: str, **fields):
+        model_manager.set_status(name, state, **fields)
+
+    def diarize(self, waveform: torch.Tensor, sample_rate: int) -> List[Dict]:
+        return diarize_audio(waveform, sample_rate)
+
+    def transcribe_batch(
+        self, segments: List[torch.Tensor], sample_rate: int
+    ) -> List[str]:
+        return [transcribe_segment(segment, sample_rate) for segment in segments]
+
+    def prepare(self, segment: torch.Tensor, sample_rate: int) -> Dict:
+        return prepare_segment(segment, sample_rate)
+
+    def transcribe_prepared(self, prepared: List[Dict], sample_rate: int) -> List[str]:
+        return [generate_segment(batch) for batch in prepared]
+
+
+def create_backend(name: str) -> InferenceBackend:
+    """按名称创建推理后端"""
+    if name == "model":
+        return ModelBackend()
+    if name == "stub":
+        return StubBackend()
+    raise ValueError(f"未知的推理后端: {name}")
+
+
+backend = create_backend(INFERENCE_BACKEND)
+
+
+def task_metrics(
+    timer: StageTimer,
+    total_seconds: float,
+    audio_seconds: float,
+    segments: List[Dict],
+) -> Dict:
+    """汇总任务的分阶段耗时与生成统计"""
+    return {
+        "stages": timer.as_dict(),
+        "total_seconds": round(total_seconds, 4),
+        "audio_seconds": round(audio_seconds, 3),
+        "real_time_factor": round(total_seconds / audio_seconds, 4)
+        if audio_seconds
+        else None,
+        "tokens_generated": timer.counters.get("tokens", 0),
+        "segments": segments,
+    }
+
+
+def save_task_metrics(task_id: str, metrics: Dict):
+    """保存任务指标, 失败不影响任务结果"""
+    try:
+        with get_db() as conn:
+            conn.execute(
+                "UPDATE tasks SET metrics = ? WHERE task_id = ?",
+                (json.dumps(metrics), task_id),
+            )
+    except Exception as e:
+        print(f"Task {task_id}: Failed to save metrics: {str(e)}")
+
+
+def preempt_task(task_id: str, priority: int, progress: Dict) -> bool:
+    """
+    有更高优先级的任务已等待超过 SCHEDULER_PREEMPT_AFTER 秒时, 保存已完成片段的进度,
+    将任务放回队列并返回 True
+    每个等待中的任务只让一个正在处理的任务让出 worker: 放回队列时在同一事务中记录
+    preempted_for, 已有任务为其让出的等待任务不再触发抢占
+    """
+    if SCHEDULER_PREEMPT_AFTER <= 0:
+        return False
+    waiting_since = (
+        datetime.now() - timedelta(seconds=SCHEDULER_PREEMPT_AFTER)
+    ).isoformat()
+    with stage("db"), get_db() as conn:
+        cursor = conn.cursor()
+        # 立即获取写锁, 多个 worker 线程不会为同一个等待任务同时让出
+        cursor.execute("BEGIN IMMEDIATE")
+        row = cursor.execute(
+            """SELECT t.task_id FROM tasks t
+               WHERE t.status = ? AND t.priority > ? AND t.created_at <= ?
+                 AND NOT EXISTS (
+                     SELECT 1 FROM tasks y
+                     WHERE y.preempted_for = t.task_id AND y.status = ?
+                 )
+               ORDER BY t.priority DESC, t.created_at
+               LIMIT 1""",
+            (TaskStatus.PENDING, priority, waiting_since, TaskStatus.PENDING),
+        ).fetchone()
+        if row is None:
+            return False
+        cursor.execute(
+            """UPDATE tasks SET status = ?, updated_at = ?, progress = ?, preempted_for = ?
+               WHERE task_id = ? AND status = ?""",
+            (
+                TaskStatus.PENDING,
+                datetime.now().isoformat(),
+                json.dumps(progress, ensure_ascii=False),
+                row["task_id"],
+                task_id,
+                TaskStatus.PROCESSING,
+            ),
+        )
+        if cursor.rowcount == 0:
+            return False
+    task_available.set()
+    return True
+
+
+def cancel_running(task_id: str) -> bool:
+    """通知本进程中正在处理该任务的线程停止, 任务不在本进程中处理时返回 False"""
+    with running_tasks_lock:
+        running = running_tasks.get(task_id)
+    if running is None:
+        return False
+    running.event.set()
+    return True
+
+
+def mark_failed(task_id: str, error_message: str):
+    """将处理中的任务标记为失败, 已被取消的任务保持取消状态"""
+    with get_db() as conn:
+        conn.execute(
+            """UPDATE tasks 
+               SET status = ?, updated_at = ?, error_message = ? 
+               WHERE task_id = ? AND status = ?""",
+            (
+                TaskStatus.FAILED,
+                datetime.now().isoformat(),
+                error_message,
+                task_id,
+                TaskStatus.PROCESSING,
+            ),
+        )
+
+
+def budget_seconds(budget: Tuple[float, float], audio_seconds: float) -> float:
+    """按音频时长计算的时间预算（秒）, 0 表示不限制"""
+    base, per_audio_second = budget
+    return base + per_audio_second * audio_seconds
+
+
+# 超时说明中的阶段名称
+TIMEOUT_STAGE_NAMES = {
+    "task": "任务处理",
+    "diarize": "说话人分离",
+    "transcribe": "片段转录",
+}
+
+
+class RunningTask:
+    """本进程中正在处理的任务: 取消标志, 以及看门狗检查的截止时间"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.thread = threading.current_thread()
+        self.started = time.monotonic()
+        self.audio_seconds = 0.0
+        # (阶段, 预算秒数, time.monotonic() 截止时间), 整个任务和当前阶段各一个
+        self.deadline: Optional[Tuple[str, float, float]] = None
+        self.stage_deadline: Optional[Tuple[str, float, float]] = None
+        # 超时原因与超时时间, 由看门狗设置
+        self.timeout: Optional[str] = None
+        self.timed_out_at: Optional[float] = None
+        self.set_audio_seconds(0.0)
+
+    def set_audio_seconds(self, audio_seconds: float):
+        """音频加载后按其时长重新计算整个任务的截止时间"""
+        self.audio_seconds = audio_seconds
+        seconds = budget_seconds(TASK_TIMEOUT, audio_seconds)
+        self.deadline = (
+            ("task", seconds, self.started + seconds) if seconds > 0 else None
+        )
+
+    @contextmanager
+    def stage_budget(
+        self, name: str, budget: Tuple[float, float], audio_seconds: float
+    ):
+        """限制一个阶段的耗时"""
+        seconds = budget_seconds(budget, audio_seconds)
+        if seconds > 0:
+            self.stage_deadline = (name, seconds, time.monotonic() + seconds)
+        try:
+            yield
+        finally:
+            self.stage_deadline = None
+
+    def expired(self, now: float) -> Optional[Tuple[str, str]]:
+        """超出时间预算时返回 (阶段, 超时原因)"""
+        for deadline in (self.stage_deadline, self.deadline):
+            if deadline is not None and now > deadline[2]:
+                name, seconds, _ = deadline
+                return name, (
+                    f"任务超时: {TIMEOUT_STAGE_NAMES[name]}超过 {seconds:g} 秒"
+                    f" (音频时长 {self.audio_seconds:.1f} 秒)"
+                )
+        return None
+
+
+def remove_upload(file_path: Optional[Path]):
+    """删除已取消任务的上传文件"""
+    if file_path is None:
+        return
+    try:
+        file_path.unlink(missing_ok=True)
+    except Exception as e:
+        print(f"Failed to remove upload {file_path}: {str(e)}")
+
+
+def process_audio_task(task_id: str) -> Optional[Dict]:
+    """
+    处理音频任务的主函数
+    各阶段耗时、每个片段的生成耗时与 token 数等指标随任务保存到数据库
+    启用抢占时, 长任务可能在片段之间被放回队列, 之后从保存的进度继续
+    任务被取消时在片段之间或生成的下一个 token 处停止, 并删除上传文件;
+    超出时间预算时由看门狗以同样的方式停止, 任务标记为失败
+    返回: 任务指标, 任务失败、被抢占或被取消时返回 None
+    """
+    timer = StageTimer()
+    start_time = time.perf_counter()
+    start_ns = time.time_ns()
+    audio_seconds = 0.0
+    segment_metrics = []
+    file_path = None
+    running = RunningTask()
+    with running_tasks_lock:
+        running_tasks[task_id] = running
+    try:
+        with (
+            activate(timer),
+            cancellation.activate(running.event),
+            tracing.task_span(task_id, "process_audio_task"),
+        ):
+            # 更新任务状态为处理中
+            with stage("db"), get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """UPDATE tasks SET status = ?, updated_at = ?
+                       WHERE task_id = ? AND status IN (?, ?)""",
+                    (
+                        TaskStatus.PROCESSING,
+                        datetime.now().isoformat(),
+                        task_id,
+                        TaskStatus.PENDING,
+                        TaskStatus.PROCESSING,
+                    ),
+                )
+
+                # 获取任务信息
+                cursor.execute(
+                    """SELECT file_path, profile, created_at, priority, progress, status
+                       FROM tasks WHERE task_id = ?""",
+                    (task_id,),
+                )
+                row = cursor.fetchone()
+                if not row:
+                    raise ValueError(f"Task {task_id} not found")
+
+                file_path = Path(row["file_path"])
+                # 领取后、开始处理前已被取消
+                if row["status"] == TaskStatus.CANCELLED:
+                    raise TaskCancelled()
+                profile = should_profile(bool(row["profile"]))
+                # 被抢占过的任务从保存的进度继续
+                progress = json.loads(row["progress"]) if row["progress"] else None
+
+            # 从创建任务到开始处理的排队时间, 挂在上传请求的 span 下
+            tracing.record_span(
+                "queue",
+                int(datetime.fromisoformat(row["created_at"]).timestamp() * 1e9),
+                start_ns,
+                parent_id=tracing.root_span_id(tracing.trace_id_for(task_id)),
+            )
+
+            # 音频只加载一次, 说话人分离和各片段转录共用
+            with stage("decode"):
+                waveform, sr = load_audio(file_path)
+            audio_seconds = waveform.shape[1] / sr
+            running.set_audio_seconds(audio_seconds)
+
+            # 按需剖析说话人分离和片段转录, 产物保存在上传文件旁
+            with profile_task(artifact_dir(file_path), profile):
+                if progress:
+                    diarization_segments = progress["segments"]
+                    results = progress["results"]
+                    segment_metrics.extend(progress["segment_metrics"])
+                    print(
+                        f"Task {task_id}: Resuming at segment "
+                        f"{len(results) + 1}/{len(diarization_segments)}"
+                    )
+                else:
+                    # 步骤1: 说话人分离
+                    print(f"Task {task_id}: Starting speaker diarization...")
+                    with (
+                        stage("diarize"),
+                        section("diarize"),
+                        running.stage_budget("diarize", DIARIZE_TIMEOUT, audio_seconds),
+                    ):
+                        diarization_segments = backend.diarize(waveform, sr)
+                    print(
+                        f"Task {task_id}: Found {len(diarization_segments)} speaker segments"
+                    )
+                    results = []
+
+                # 步骤2: 对每个片段进行语音识别
+                # 后台线程提前切片并准备之后几个片段的模型输入, 与当前片段的生成重叠
+                def prepare(i: int):
+                    segment = diarization_segments[i]
+                    audio_segment = extract_audio_segment(
+                        waveform, sr, segment["start"], segment["end"]
+                    )
+                    return audio_segment.shape[1] / sr, backend.prepare(
+                        audio_segment, sr
+                    )
+
+                pending = range(len(results), len(diarization_segments))
+                with Prefetcher(
+                    prepare, pending, SEGMENT_PREFETCH_DEPTH
+                ) as prepared_segments:
+                    for i, (segment_seconds, prepared) in zip(
+                        pending, prepared_segments
+                    ):
+                        cancellation.check()
+                        segment = diarization_segments[i]
+                        print(
+                            f"Task {task_id}: Transcribing segment {i + 1}/{len(diarization_segments)}"
+                        )
+
+                        # 转录
+                        generate_before = timer.stages.get("generate", 0.0)
+                        tokens_before = timer.counters.get("tokens", 0)
+                        with (
+                            section("transcribe", segment=i),
+                            tracing.span(
+                                "transcribe_segment",
+                                segment=i,
+                                audio_seconds=round(segment_seconds, 3),
+                            ),
+                            running.stage_budget(
+                                "transcribe", SEGMENT_TIMEOUT, segment_seconds
+                            ),
+                        ):
+                            text = backend.transcribe_prepared([prepared], sr)[0]
+                        segment_metrics.append(
+                            {
+                                "audio_seconds": round(segment_seconds, 3),
+                                "generate_seconds": round(
+                                    timer.stages.get("generate", 0.0) - generate_before,
+                                    4,
+                                ),
+                                "tokens": timer.counters.get("tokens", 0)
+                                - tokens_before,
+                            }
+                        )
+
+                        results.append(
+                            {
+                                "speaker_id": segment["speaker"],
+                                "start": segment["start"],
+                                "end": segment["end"],
+                                "text": text,
+                            }
+                        )
+
+                        # 片段之间让出 worker 给等待中的高优先级任务
+                        if i + 1 < len(diarization_segments) and preempt_task(
+                            task_id,
+                            row["priority"],
+                            {
+                                "segments": diarization_segments,
+                                "results": results,
+                                "segment_metrics": segment_metrics,
+                            },
+                        ):
+                            print(
+                                f"Task {task_id}: Preempted after segment "
+                                f"{i + 1}/{len(diarization_segments)}, requeued"
+                            )
+                            return None
+
+            # 步骤3: 保存结果
+            with stage("db"), get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """UPDATE tasks 
+                       SET status = ?, updated_at = ?, result = ?, progress = NULL 
+                       WHERE task_id = ? AND status = ?""",
+                    (
+                        TaskStatus.COMPLETED,
+                        datetime.now().isoformat(),
+                        json.dumps(results, ensure_ascii=False),
+                        task_id,
+                        TaskStatus.PROCESSING,
+                    ),
+                )
+                # 处理最后一个片段期间被取消
+                if cursor.rowcount == 0:
+                    raise TaskCancelled()
+
+        print(f"Task {task_id}: Completed successfully")
+        result_metrics = task_metrics(
+            timer, time.perf_counter() - start_time, audio_seconds, segment_metrics
+        )
+        save_task_metrics(task_id, result_metrics)
+        metrics.observe_task(TaskStatus.COMPLETED, result_metrics)
+        return result_metrics
+
+    except TaskCancelled:
+        if running.timeout is not None:
+            # 由看门狗因超时停止
+            print(f"Task {task_id}: Failed with error: {running.timeout}")
+            mark_failed(task_id, running.timeout)
+            result_metrics = task_metrics(
+                timer, time.perf_counter() - start_time, audio_seconds, segment_metrics
+            )
+            save_task_metrics(task_id, result_metrics)
+            metrics.observe_task(TaskStatus.FAILED, result_metrics)
+            return None
+        print(f"Task {task_id}: Cancelled")
+        remove_upload(file_path)
+        result_metrics = task_metrics(
+            timer, time.perf_counter() - start_time, audio_seconds, segment_metrics
+        )
+        save_task_metrics(task_id, result_metrics)
+        metrics.observe_task(TaskStatus.CANCELLED, result_metrics)
+        return None
+
+    except Exception as e:
+        print(f"Task {task_id}: Failed with error: {str(e)}")
+        mark_failed(task_id, str(e))
+        # 失败任务也保存已完成部分的耗时, 便于定位卡在哪个阶段
+        result_metrics = task_metrics(
+            timer, time.perf_counter() - start_time, audio_seconds, segment_metrics
+        )
+        save_task_metrics(task_id, result_metrics)
+        metrics.observe_task(TaskStatus.FAILED, result_metrics)
+        return None
+
+    finally:
+        with running_tasks_lock:
+            # 被看门狗回收后可能已被移除
+            if running_tasks.get(task_id) is running:
+                del running_tasks[task_id]
+
+
+# ==================== 预加载与预热 ====================
+
+
+def warmup_model(name: str, warmup_seconds: List[float]):
+    """用合成音频跑一遍推理, 触发 CUDA 初始化和算子选择"""
+    sr = 16000
+    for seconds in warmup_seconds:
+        # 低幅度噪声, 避免全零输入走特殊分支
+        wav = torch.randn(1, int(seconds * sr)) * 0.01
+        if name == "asr":
+            backend.transcribe_batch([wav], sr)
+        else:
+            backend.diarize(wav, sr)
+
+
+def preload_model(name: str, warmup_seconds: List[float]):
+    """加载单个模型并预热"""
+    backend.load(name)
+
+    if not warmup_seconds:
+        return
+
+    backend.set_status(name, "warming_up")
+    start = time.perf_counter()
+    try:
+        warmup_model(name, warmup_seconds)
+    except Exception as e:
+        backend.set_status(name, "failed", error=f"预热失败: {str(e)}")
+        raise
+    backend.set_status(name, "ready", warmup_seconds=time.perf_counter() - start)
+    print(f"{name} warm-up finished in {time.perf_counter() - start:.2f}s")
+
+    if name == "asr" and backend.name == "model" and ASR_COMPILE != "off":
+        # 预热已触发编译, 保存编译缓存供下次启动直接加载
+        from acceleration import save_compile_cache
+
+        try:
+            save_compile_cache()
+        except Exception as e:
+            print(f"Failed to save compile cache: {str(e)}")
+
+
+def preload_models(
+    models: List[str] = PRELOAD_MODELS,
+    warmup_seconds: List[float] = WARMUP_SECONDS,
+):
+    """并发加载并预热指定模型, 完成后设置 preload_done"""
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(models), 1)) as executor:
+            futures = {
+                name: executor.submit(preload_model, name, warmup_seconds)
+                for name in models
+            }
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Failed to preload {name}: {str(e)}")
+    finally:
+        preload_done.set()
+
+
+def readiness() -> Dict:
+    """
+    就绪状态: 预加载完成, 且所有预加载的模型都已就绪
+    未启用预加载时, 模型在首个任务中按需加载, 始终视为就绪
+    """
+    models = backend.status()
+    # 空闲卸载的模型会在下一个任务中重新加载, 不影响就绪
+    ready = preload_done.is_set() and all(
+        models[name]["state"] in ("ready", "evicted") for name in PRELOAD_MODELS
+    )
+    return {
+        "ready": ready,
+        "backend": backend.name,
+        "preload": PRELOAD_MODELS,
+        "models": models,
+    }
+
+
+# ==================== 任务领取 ====================
+
+
+def claim_next_task() -> Optional[str]:
+    """
+    领取下一个待处理任务, 并将其标记为处理中
+    优先级高的先处理; 同优先级内优先选择 SCHEDULER_FAIR_WINDOW 内已处理音频时长
+    最少的客户端, 避免批量上传的客户端占满 worker; 再按创建时间先后
+    多个 worker 进程并发领取时, 每个任务只会被领取一次
+    返回: task_id, 没有待处理任务时返回 None
+    """
+    now = datetime.now()
+    window_start = (now - timedelta(seconds=SCHEDULER_FAIR_WINDOW)).isoformat()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # 立即获取写锁, 保证查询和更新之间不会被其他 worker 抢先
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            """WITH served AS (
+                   SELECT client_id, SUM(audio_seconds) AS seconds
+                   FROM tasks
+                   WHERE started_at >= ?
+                   GROUP BY client_id
+               )
+               SELECT t.task_id FROM tasks t
+               LEFT JOIN served s ON s.client_id IS t.client_id
+               WHERE t.status = ?
+               ORDER BY t.priority DESC, COALESCE(s.seconds, 0), t.created_at
+               LIMIT 1""",
+            (window_start, TaskStatus.PENDING),
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        # 被抢占后再次领取时保留首次开始时间, 公平统计不重复计入该任务的音频时长
+        cursor.execute(
+            """UPDATE tasks SET status = ?, updated_at = ?, started_at = COALESCE(started_at, ?)
+               WHERE task_id = ?""",
+            (TaskStatus.PROCESSING, now.isoformat(), now.isoformat(), row["task_id"]),
+        )
+        return row["task_id"]
+
+
+def run_worker(
+    stop_event: Optional[threading.Event] = None,
+    poll_interval: float = WORKER_POLL_INTERVAL,
+):
+    """Worker 主循环: 持续领取并处理任务, 直到 stop_event 被设置"""
+    stop_event = stop_event or threading.Event()
+    # 预加载完成前不领取任务, 避免首个任务承担加载和预热开销
+    while not preload_done.wait(poll_interval):
+        if stop_event.is_set():
+            return
+
+    while not stop_event.is_set():
+        try:
+            task_id = claim_next_task()
+        except Exception as e:
+            print(f"Worker: Failed to claim task: {str(e)}")
+            task_id = None
+
+        if task_id is None:
+            task_available.wait(poll_interval)
+            task_available.clear()
+            continue
+
+        process_audio_task(task_id)
+        # 本线程曾卡在推理中, 已有替代的 worker 线程
+        if threading.current_thread() in retired_threads:
+            retired_threads.discard(threading.current_thread())
+            return
+
+
+def run_watchdog(
+    stop_event: threading.Event, recycle: Callable[[str, RunningTask], None]
+):
+    """
+    看门狗: 任务超出时间预算时设置其取消标志, 任务在片段之间、生成的下一个 token 处
+    或说话人分离的下一个批次处停止并标记为失败; 超时 WATCHDOG_GRACE_SECONDS 秒后
+    仍未停止时 (卡在不可中断的计算中), 直接将任务标记为失败并调用 recycle 回收 worker
+    """
+    while not stop_event.wait(WATCHDOG_INTERVAL):
+        now = time.monotonic()
+        with running_tasks_lock:
+            tasks = list(running_tasks.items())
+        for task_id, running in tasks:
+            if running.timeout is None:
+                expired = running.expired(now)
+                if expired is None:
+                    continue
+                name, running.timeout = expired
+                running.timed_out_at = now
+                running.event.set()
+                metrics.task_timeouts_total.inc(stage=name)
+                print(f"Task {task_id}: {running.timeout}, stopping")
+            elif now - running.timed_out_at > WATCHDOG_GRACE_SECONDS:
+                print(
+                    f"Task {task_id}: Still running {WATCHDOG_GRACE_SECONDS:g}s after "
+                    f"timing out, recycling worker"
+                )
+                with running_tasks_lock:
+                    if running_tasks.get(task_id) is running:
+                        del running_tasks[task_id]
+                try:
+                    mark_failed(
+                        task_id, f"{running.timeout}, 推理无响应, worker 已回收"
+                    )
+                except Exception as e:
+                    print(f"Task {task_id}: Failed to mark as failed: {str(e)}")
+                metrics.worker_recycles_total.inc()
+                recycle(task_id, running)
+
+
+def exit_for_recycle(task_id: str, running: RunningTask):
+    """
+    卡住的线程无法从外部结束, 独立运行的 worker 进程直接退出, 由进程池或外部守护进程重启;
+    本进程中其他处理中的任务放回队列
+    """
+    with running_tasks_lock:
+        others = list(running_tasks)
+    for other in others:
+        try:
+            with get_db() as conn:
+                conn.execute(
+                    "UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ? AND status = ?",
+                    (
+                        TaskStatus.PENDING,
+                        datetime.now().isoformat(),
+                        other,
+                        TaskStatus.PROCESSING,
+                    ),
+                )
+        except Exception as e:
+            print(f"Task {other}: Failed to requeue: {str(e)}")
+    print(
+        f"Worker process {os.getpid()}: Exiting with code {WATCHDOG_EXIT_CODE} to recycle"
+    )
+    os._exit(WATCHDOG_EXIT_CODE)
+
+
+def run_cancel_watcher(stop_event: threading.Event):
+    """定期检查本进程中正在处理的任务是否已被取消 (api 模式下由其他进程取消)"""
+    while not stop_event.wait(WORKER_CANCEL_POLL_INTERVAL):
+        with running_tasks_lock:
+            task_ids = list(running_tasks)
+        if not task_ids:
+            continue
+        try:
+            with get_db() as conn:
+                rows = conn.execute(
+                    f"""SELECT task_id FROM tasks
+                        WHERE status = ? AND task_id IN ({", ".join("?" * len(task_ids))})""",
+                    (TaskStatus.CANCELLED, *task_ids),
+                ).fetchall()
+        except Exception as e:
+            print(f"Worker: Failed to check cancelled tasks: {str(e)}")
+            continue
+        for row in rows:
+            cancel_running(row["task_id"])
+
+
+def run_model_reaper(stop_event: threading.Event):
+    """定期卸载空闲超时的模型"""
+    timeouts = [t for t in MODEL_IDLE_TIMEOUTS.values() if t > 0]
+    interval = min(min(timeouts) / 4, 60)
+    while not stop_event.wait(interval):
+        try:
+            model_manager.evict_idle()
+        except Exception as e:
+            print(f"Worker: Failed to evict idle models: {str(e)}")
+
+
+def start_workers(
+    concurrency: int,
+    stop_event: threading.Event,
+    poll_interval: float = WORKER_POLL_INTERVAL,
+    exit_on_hang: bool = False,
+) -> List[threading.Thread]:
+    """
+    启动预加载线程和 worker 线程
+    推理卡住时, exit_on_hang 为 True 则退出进程 (独立运行的 worker),
+    否则启动一个新的 worker 线程替代卡住的线程 (嵌入模式)
+    """
+    if PRELOAD_MODELS:
+        threading.Thread(target=preload_models, name="preload", daemon=True).start()
+    else:
+        preload_done.set()
+
+    if any(timeout > 0 for timeout in MODEL_IDLE_TIMEOUTS.values()):
+        threading.Thread(
+            target=run_model_reaper,
+            args=(stop_event,),
+            name="model-reaper",
+            daemon=True,
+        ).start()
+
+    threading.Thread(
+        target=run_cancel_watcher,
+        args=(stop_event,),
+        name="cancel-watcher",
+        daemon=True,
+    ).start()
+
+    threads = []
+
+    def spawn_worker():
+        thread = threading.Thread(
+            target=run_worker,
+            args=(stop_event, poll_interval),
+            name=f"worker-{len(threads)}",
+            daemon=True,
+        )
+        threads.append(thread)
+        thread.start()
+
+    def replace_worker(task_id: str, running: RunningTask):
+        retired_threads.add(running.thread)
+        spawn_worker()
+
+    threading.Thread(
+        target=run_watchdog,
+        args=(stop_event, exit_for_recycle if exit_on_hang else replace_worker),
+        name="watchdog",
+        daemon=True,
+    ).start()
+
+    for _ in range(concurrency):
+        spawn_worker()
+    return threads
+
+
+def run_heartbeat(worker_id: str, stop_event: threading.Event):
+    """定期将 worker 的就绪状态写入数据库, 供 api 模式的 /ready 查询"""
+    while True:
+        try:
+            record_worker_heartbeat(
+                worker_id, json.dumps(readiness(), ensure_ascii=False)
+            )
+        except Exception as e:
+            print(f"Worker: Failed to record heartbeat: {str(e)}")
+        if stop_event.wait(WORKER_HEARTBEAT_INTERVAL):
+            return
+
+
+# ==================== CPU 进程池 ====================
+
+
+def configure_cpu(num_threads: int, cores: Optional[List[int]] = None):
+    """设置本进程的 torch 计算线程数, 并可选地绑定到指定 CPU 核"""
+    if cores:
+        os.sched_setaffinity(0, cores)
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+        try:
+            # 多进程部署时进程间已经并行, 算子间并行只会争抢核心
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # 已经执行过并行计算后不能再修改
+
+
+def plan_cpu_layout(
+    processes: int,
+    threads_per_process: int = 0,
+    pin_cores: bool = False,
+) -> List[Dict]:
+    """
+    为每个 worker 进程分配线程数和 CPU 核
+    threads_per_process 为 0 时平分当前进程可用的核
+    返回: [{"threads": 16, "cores": [0, ..., 15] 或 None}, ...]
+    """
+    available = sorted(os.sched_getaffinity(0))
+    if threads_per_process <= 0:
+        threads_per_process = max(len(available) // processes, 1)
+
+    layout = []
+    for i in range(processes):
+        cores = None
+        if pin_cores:
+            start = (i * threads_per_process) % len(available)
+            cores = [
+                available[(start + j) % len(available)]
+                for j in range(threads_per_process)
+            ]
+        layout.append({"threads": threads_per_process, "cores": cores})
+    return layout
+
+
+def serve(
+    concurrency: int, poll_interval: float, metrics_port: int = WORKER_METRICS_PORT
+):
+    """在当前进程中运行 worker: 上报心跳并处理任务, 直到收到 Ctrl+C"""
+    init_db()
+    print(f"Worker running on device: {DEVICE}")
+    if metrics_port:
+        metrics.start_http_server(metrics_port)
+        print(f"Worker metrics on port {metrics_port}")
+
+    stop_event = threading.Event()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    threading.Thread(
+        target=run_heartbeat,
+        args=(worker_id, stop_event),
+        name="heartbeat",
+        daemon=True,
+    ).start()
+    threads = start_workers(concurrency, stop_event, poll_interval, exit_on_hang=True)
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Worker stopping...")
+        stop_event.set()
+        task_available.set()
+        for thread in threads:
+            thread.join()
+
+
+def run_worker_process(
+    concurrency: int,
+    poll_interval: float,
+    num_threads: int,
+    cores: Optional[List[int]],
+    metrics_port: int = 0,
+):
+    """进程池中每个子进程的入口"""
+    configure_cpu(num_threads, cores)
+    print(
+        f"Worker process {os.getpid()}: {num_threads} threads"
+        + (f", cores {cores}" if cores else "")
+    )
+    serve(concurrency, poll_interval, metrics_port)
+
+
+def run_process_pool(layout: List[Dict], concurrency: int, poll_interval: float):
+    """
+    启动多个 worker 子进程, 各自从数据库领取任务, 任务因此在进程间自然分片
+    子进程意外退出时自动重启
+    """
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+
+    def spawn(index: int):
+        process = ctx.Process(
+            target=run_worker_process,
+            args=(
+                concurrency,
+                poll_interval,
+                layout[index]["threads"],
+                layout[index]["cores"],
+                WORKER_METRICS_PORT + index if WORKER_METRICS_PORT else 0,
+            ),
+            name=f"worker-process-{index}",
+        )
+        process.start()
+        processes[index] = process
+
+    for index in range(len(layout)):
+        spawn(index)
+
+    try:
+        while True:
+            time.sleep(1)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    print(
+                        f"Worker process {process.pid} exited with code "
+                        f"{process.exitcode}, restarting"
+                    )
+                    spawn(index)
+    except KeyboardInterrupt:
+        # 子进程与父进程同属一个进程组, 会同时收到 Ctrl+C 并自行退出;
+        # 超时仍未退出的强制结束
+        print("Worker pool stopping...")
+        for process in processes.values():
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音识别推理 Worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="每个进程内并发处理的任务数",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=WORKER_POLL_INTERVAL,
+        help="没有待处理任务时的轮询间隔（秒）",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="worker 进程数, 大于 1 时启动多进程池",
+    )
+    parser.add_argument(
+        "--threads_per_process",
+        type=int,
+        default=0,
+        help="每个进程的 torch 线程数, 0 表示平分可用 CPU 核",
+    )
+    parser.add_argument(
+        "--pin_cores",
+        action="store_true",
+        help="将每个进程绑定到互不重叠的 CPU 核",
+    )
+    args = parser.parse_args()
+
+    if args.processes > 1:
+        layout = plan_cpu_layout(
+            args.processes, args.threads_per_process, args.pin_cores
+        )
+        run_process_pool(layout, args.concurrency, args.poll_interval)
+    else:
+        if args.threads_per_process > 0 or args.pin_cores:
+            layout = plan_cpu_layout(1, args.threads_per_process, args.pin_cores)
+            configure_cpu(layout[0]["threads"], layout[0]["cores"])
+        serve(args.concurrency, args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()